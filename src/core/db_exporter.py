@@ -1,24 +1,168 @@
-import sqlite3
 import csv
+import gzip
+import io
+import json
+import sqlite3
+import zlib
+from itertools import groupby
+from operator import itemgetter
 
-def export_to_csv(db_path, output_path):
+EXPORT_FORMATS = ("csv", "json", "ndjson", "markdown")
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "markdown": "text/markdown",
+}
+
+FILE_EXTENSIONS = {
+    "csv": "csv",
+    "json": "json",
+    "ndjson": "ndjson",
+    "markdown": "md",
+}
+
+# Text is handed out in chunks of roughly this many characters
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_groups(conn, duplicates_only=False):
+    """
+    Yields (hash, [paths]) groups from a single ordered query over file_paths.
+    The ORDER BY matches the UNIQUE(hash, path) index, so SQLite streams rows without
+    sorting and only one group is held in memory at a time.
+    """
+    cursor = conn.execute("SELECT hash, path FROM file_paths ORDER BY hash, path")
+    for hash_val, rows in groupby(cursor, key=itemgetter(0)):
+        paths = [path for _, path in rows]
+        if duplicates_only and len(paths) < 2:
+            continue
+        yield hash_val, paths
+
+
+def _csv_lines(groups):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["hash", "paths"])
+    yield buf.getvalue()
+    for hash_val, paths in groups:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerow([hash_val, ";".join(paths)])
+        yield buf.getvalue()
+
+
+def _json_lines(groups):
+    yield "{"
+    for i, (hash_val, paths) in enumerate(groups):
+        yield f"{',' if i else ''}\n  {json.dumps(hash_val)}: {json.dumps(paths)}"
+    yield "\n}\n"
+
+
+def _ndjson_lines(groups):
+    for hash_val, paths in groups:
+        yield json.dumps({"hash": hash_val, "paths": paths}) + "\n"
+
+
+def _markdown_lines(groups):
+    yield "# Duplicate Summary\n\n"
+    for hash_val, paths in groups:
+        yield f"### Hash: `{hash_val}`\n" + "".join(f"- {path}\n" for path in paths) + "\n"
+
+
+_WRITERS = {
+    "csv": _csv_lines,
+    "json": _json_lines,
+    "ndjson": _ndjson_lines,
+    "markdown": _markdown_lines,
+}
+
+
+def _chunked(pieces, size=CHUNK_SIZE):
+    """Joins small text pieces into chunks of about size characters."""
+    buf = []
+    length = 0
+    for piece in pieces:
+        buf.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield "".join(buf)
+            buf = []
+            length = 0
+    if buf:
+        yield "".join(buf)
+
+
+def render_export(groups, fmt="csv"):
+    """Renders (hash, [paths]) groups as text chunks in the given export format."""
+    if fmt not in _WRITERS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    return _chunked(_WRITERS[fmt](groups))
+
+
+def iter_export(db_path, fmt="csv", duplicates_only=None, conn=None):
+    """
+    Streams the database as csv, json, ndjson or markdown text chunks in constant memory.
+    duplicates_only defaults to True for markdown (a summary of duplicates) and False
+    for the data formats. Reads through conn when given (the caller closes it), otherwise
+    opens a connection that is closed when the generator finishes or is closed.
+    """
+    if fmt not in _WRITERS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if duplicates_only is None:
+        duplicates_only = fmt == "markdown"
+
+    # Streaming responses may resume the generator on a different worker thread
+    own = conn is None
+    if own:
+        conn = sqlite3.connect(db_path, check_same_thread=False)
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT hash FROM hashes")
-        hashes = cursor.fetchall()
+        yield from render_export(iter_groups(conn, duplicates_only), fmt)
+    finally:
+        if own:
+            conn.close()
+
 
-        with open(output_path, "w", newline="") as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(["Hash", "File Paths"])
+def gzip_stream(chunks):
+    """Compresses a stream of text chunks into gzip bytes on the fly."""
+    compressor = zlib.compressobj(wbits=31)  # 31: gzip header and trailer
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
 
-            for (hash_val,) in hashes:
-                cursor.execute("SELECT path FROM file_paths WHERE hash = ?", (hash_val,))
-                paths = [row[0] for row in cursor.fetchall()]
-                writer.writerow([hash_val, ";".join(paths)])
 
+def format_for_path(output_path):
+    """Guesses the export format from a file name such as dupes.ndjson.gz (default: csv)."""
+    name = str(output_path).lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    for fmt, ext in FILE_EXTENSIONS.items():
+        if name.endswith("." + ext):
+            return fmt
+    return "csv"
+
+
+def export_to_file(db_path, output_path, fmt=None, compress=None, duplicates_only=None):
+    """
+    Writes an export to output_path. fmt and compress default to what the file name
+    suggests (e.g. report.json.gz → gzipped JSON).
+    """
+    fmt = fmt or format_for_path(output_path)
+    if compress is None:
+        compress = str(output_path).lower().endswith(".gz")
+
+    opener = gzip.open if compress else open
+    try:
+        with opener(output_path, "wt", newline="", encoding="utf-8") as out:
+            for chunk in iter_export(db_path, fmt, duplicates_only):
+                out.write(chunk)
         print(f"[✓] Exported to {output_path}")
     except Exception as e:
         print(f"[!] Export error: {e}")
-    finally:
-        conn.close()
+
+
+def export_to_csv(db_path, output_path):
+    export_to_file(db_path, output_path, "csv")
@@ -0,0 +1,154 @@
+import logging
+import os
+import sqlite3
+from urllib.parse import quote
+
+from db_utils.db_utils import create_db, rebuild_duplicate_summary, mark_summary_stale, STAT_COLUMNS, LEGACY_ALGO
+
+logger = logging.getLogger(__name__)
+
+# Separates a source's namespace from its paths, as in host:/data/file.txt
+NAMESPACE_SEPARATOR = ":"
+
+
+def parse_source(spec):
+    """
+    Parses a --merge source "[NAME=]PATH" into (namespace, path). Without NAME the
+    namespace is the DB file name without extension; an empty NAME ("=PATH") keeps
+    the source's paths unprefixed. Only a first "=" with no path separator before it
+    starts a NAME, so a path such as /data/run=2/host.db parses as a plain path.
+    """
+    name, sep, path = spec.partition("=")
+    if not sep or "/" in name or os.sep in name:
+        return os.path.splitext(os.path.basename(spec))[0], spec
+    return name, path
+
+
+def _namespaced(namespace):
+    return namespace + NAMESPACE_SEPARATOR if namespace else ""
+
+
+def _attach_read_only(conn, path):
+    """ATTACHes a source as src with mode=ro, so merging never writes to (or migrates) an input."""
+    conn.execute("ATTACH DATABASE ? AS src", (f"file:{quote(os.path.abspath(path))}?mode=ro",))
+
+
+def _source_columns(conn, path):
+    """
+    Returns the SELECT expressions for the target's file_paths columns from an
+    attached source of any schema version: columns an older scanner did not write
+    yet are read as NULL, and a missing algo is derived from the hash length.
+    """
+    columns = {row[1] for row in conn.execute("PRAGMA src.table_info(file_paths)")}
+    if not {"hash", "path"} <= columns:
+        raise ValueError(f"{path} is not a scan database (no file_paths table with hash and path)")
+    stats = [name if name in columns else "NULL" for name in STAT_COLUMNS]
+    algo = f"COALESCE(algo, {LEGACY_ALGO})" if "algo" in columns else LEGACY_ALGO
+    return stats, algo
+
+
+def _has_hardlinks(conn):
+    return conn.execute("SELECT 1 FROM src.sqlite_master WHERE type = 'table' AND name = 'hardlinks'").fetchone()
+
+
+def merge_databases(target_path, sources):
+    """
+    Merges scan databases into target_path. sources is a list of (namespace, db_path);
+    each source's paths are stored as "<namespace>:<path>" (unchanged for an empty
+    namespace), so the same path scanned on two hosts stays two files.
+
+    Each source is ATTACHed read-only and copied with one INSERT ... SELECT per table
+    inside a single transaction, so SQLite moves the rows without a Python round trip
+    per row. Sources are read as they are, whatever their schema version, and never
+    upgraded in place. Merging a namespace again replaces its earlier rows, so a host
+    that rescans can be merged afresh; hashes no path refers to any more are dropped
+    with them. All sources and the target must hold hashes from one algorithm;
+    otherwise ValueError is raised before anything is written, as it is when two
+    sources share a namespace (e.g. hostA/hashes.db and hostB/hashes.db without
+    NAMEs), since the second would replace the first's rows. The duplicate summary
+    is rebuilt once at the end. Returns {source db_path: rows merged}.
+    """
+    namespaces = [namespace for namespace, _ in sources if namespace]
+    shared = sorted({namespace for namespace in namespaces if namespaces.count(namespace) > 1})
+    if shared:
+        raise ValueError(f"Several sources would be merged as {', '.join(shared)}; give each a NAME= of its own")
+
+    for namespace, path in sources:
+        if not os.path.isfile(path):
+            raise ValueError(f"Source database not found: {path}")
+    create_db(target_path)
+
+    # A URI connection, so ATTACH understands the mode=ro of the sources
+    conn = sqlite3.connect(f"file:{quote(os.path.abspath(target_path))}", uri=True, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+        algos = {row[0] for row in conn.execute("SELECT DISTINCT algo FROM file_paths")}
+        selects = {}
+        for namespace, path in sources:
+            _attach_read_only(conn, path)
+            try:
+                selects[path] = _source_columns(conn, path)
+                found = {row[0] for row in conn.execute(f"SELECT DISTINCT {selects[path][1]} FROM src.file_paths")}
+            finally:
+                conn.execute("DETACH DATABASE src")
+            algos |= found
+            if len(algos) > 1:
+                raise ValueError(
+                    f"{path} holds hashes made with {', '.join(sorted(map(str, found)))} but the merge already "
+                    f"has {', '.join(sorted(map(str, algos - found)))}; hashes from different algorithms "
+                    f"can never match"
+                )
+
+        merged = {}
+        for namespace, path in sources:
+            prefix = _namespaced(namespace)
+            stats, algo = selects[path]
+            _attach_read_only(conn, path)
+            try:
+                conn.execute("BEGIN")
+                mark_summary_stale(conn)
+                if prefix:
+                    # Drop what an earlier merge of this namespace left behind
+                    bounds = (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+                    conn.execute("DELETE FROM file_paths WHERE path >= ? AND path < ?", bounds)
+                    conn.execute("DELETE FROM hardlinks WHERE path >= ? AND path < ?", bounds)
+
+                conn.execute("INSERT OR IGNORE INTO hashes (hash) SELECT DISTINCT hash FROM src.file_paths")
+                cursor = conn.execute(f'''
+                    INSERT INTO file_paths (hash, path, size, mtime_ns, inode, device, algo)
+                    SELECT hash, ? || path, {", ".join(stats)}, {algo} FROM src.file_paths WHERE true
+                    ON CONFLICT (hash, path) DO UPDATE SET
+                        size = excluded.size,
+                        mtime_ns = excluded.mtime_ns,
+                        inode = excluded.inode,
+                        device = excluded.device,
+                        algo = excluded.algo
+                ''', (prefix,))
+                merged[path] = cursor.rowcount
+                if _has_hardlinks(conn):
+                    conn.execute('''
+                        INSERT OR REPLACE INTO hardlinks (path, target, inode, device)
+                        SELECT ? || path, ? || target, inode, device FROM src.hardlinks
+                    ''', (prefix, prefix))
+                if prefix:
+                    # Hashes only the replaced rows referred to
+                    conn.execute(
+                        "DELETE FROM hashes WHERE NOT EXISTS (SELECT 1 FROM file_paths WHERE file_paths.hash = hashes.hash)"
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.execute("DETACH DATABASE src")
+            logger.info(f"Merged {merged[path]} paths from {path}" + (f" as {prefix}…" if prefix else ""))
+    finally:
+        conn.close()
+
+    summary = rebuild_duplicate_summary(target_path)
+    logger.info(f"✅ Merge complete: {summary['files']} paths, {summary['groups']} duplicate groups, "
+                f"{summary['wasted_bytes']} bytes wasted")
+    return merged
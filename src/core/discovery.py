@@ -3,11 +3,11 @@ import logging
 from collections import defaultdict
 from core.file_scanner import walk_files
 
-def run_discovery_mode(directory, log_file_path):
+def run_discovery_mode(directory, log_file_path, excluded_dirs=None, walkers=1):
     """Scans all files and logs filetype counts to a log file."""
     ext_counts = defaultdict(int)
 
-    for file_path in walk_files(directory):
+    for file_path in walk_files(directory, excluded_dirs=excluded_dirs, walkers=walkers):
         _, ext = os.path.splitext(file_path)
         ext = ext.lower()
         if ext:
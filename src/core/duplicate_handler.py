@@ -1,87 +1,459 @@
-import os
 import logging
+import os
 import sqlite3
-
-from core.file_scanner import walk_files, load_filetypes
-from core.file_hasher import compute_hash
-from db_utils.db_utils import create_db
+import time
+from collections import Counter
+from contextlib import nullcontext
+from functools import partial
+
+from core.file_scanner import walk_file_entries, load_filetypes, load_excluded_dirs, signature
+from core.file_hasher import (
+    compute_hash,
+    compute_fingerprint,
+    sample_offsets,
+    DEFAULT_SAMPLE_SIZE,
+    DEFAULT_BUFFER_SIZE,
+    HASH_ALGORITHMS
+)
+from core.hash_engine import hash_files, ordered_map, DEFAULT_IPC_BATCH
+from core.scan_pipeline import run_pipeline
+from core.scan_checkpoint import begin_scan, finish_scan, checkpointed_walk
+from db_utils.db_utils import (
+    BulkWriter,
+    DEFAULT_COMMIT_SIZE,
+    create_db,
+    load_hash_cache,
+    load_fingerprint_cache,
+    purge_paths,
+    rebuild_duplicate_summary,
+    read_duplicate_summary,
+    stored_hash_algorithms
+)
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 
-def store_batch_in_db(db_path, batch):
-    """Stores a batch of (hash, path) pairs into the database."""
+def store_batch_in_db(db_path, batch, hash_algo="md5"):
+    """
+    Stores a batch of (hash, path, size, mtime_ns, inode, device) rows into the database,
+    tagged with the algorithm that produced the hashes.
+    Rows already present for (hash, path) get their stat signature refreshed.
+    """
     if not db_path:
         logger.warning("No database path provided. Skipping batch insert.")
         return
 
     try:
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
+        with BulkWriter(db_path, commit_size=len(batch) or 1, hash_algo=hash_algo) as writer:
+            writer.add_many(batch)
+    except Exception as e:
+        logger.error(f"❌ Error in batch insert: {e}")
 
-        for file_hash, file_path in batch:
-            c.execute('INSERT OR IGNORE INTO hashes (hash) VALUES (?)', (file_hash,))
-            c.execute('SELECT 1 FROM file_paths WHERE hash = ? AND path = ?', (file_hash, file_path))
-            if not c.fetchone():
-                c.execute('INSERT INTO file_paths (hash, path) VALUES (?, ?)', (file_hash, file_path))
 
-        conn.commit()
-        logger.info(f"✅ Stored batch of {len(batch)} entries in DB.")
+def store_fingerprints_in_db(db_path, fingerprints, sample_size, sample_middle, hash_algo, metrics=None):
+    """Stores (entry, fingerprint) pairs into the fingerprints table along with the sampling settings."""
+    if not db_path or not fingerprints:
+        return
+
+    try:
+        with BulkWriter(db_path, hash_algo=hash_algo, metrics=metrics) as writer:
+            writer.add_fingerprints(fingerprints, sample_size, sample_middle)
     except Exception as e:
-        logger.error(f"❌ Error in batch insert: {e}")
-    finally:
-        conn.close()
+        logger.error(f"❌ Error storing fingerprints: {e}")
 
 
-def find_duplicates(directory, db_path, filetypes_path=None, debug=False, batch_size=100, hash_algo="md5"):
-    """Scans a directory, filters by filetypes, and stores hashes and paths in normalized DB."""
+def store_hardlinks_in_db(db_path, links, metrics=None):
+    """Stores (link_entry, target_path) pairs into the hardlinks table."""
+    if not db_path or not links:
+        return
+
+    try:
+        with BulkWriter(db_path, metrics=metrics) as writer:
+            writer.add_hardlinks(links)
+    except Exception as e:
+        logger.error(f"❌ Error storing hardlinks: {e}")
+
+
+def split_hardlinks(entries):
+    """
+    Separates paths that share a (device, inode) with another walked path.
+    The lexicographically smallest path of each inode is kept as its target so the
+    choice does not depend on walk order.
+    Returns (unique_entries, links) where links holds (link_entry, target_path) pairs.
+    """
+    targets = {}
+    for entry in entries:
+        if not entry.inode:
+            continue  # filesystem without stable inode numbers
+        key = (entry.device, entry.inode)
+        if key not in targets or entry.path < targets[key]:
+            targets[key] = entry.path
+
+    unique = []
+    links = []
+    for entry in entries:
+        target = targets.get((entry.device, entry.inode), entry.path) if entry.inode else entry.path
+        if target == entry.path:
+            unique.append(entry)
+        else:
+            links.append((entry, target))
+    return unique, links
+
+
+def group_by_size(entries):
+    """
+    Drops FileEntry rows whose byte size is unique, since they cannot have a duplicate.
+    Returns (candidates, unique_count) where candidates keeps walk order.
+    """
+    size_counts = Counter(entry.size for entry in entries)
+    candidates = [entry for entry in entries if size_counts[entry.size] > 1]
+    return candidates, len(entries) - len(candidates)
+
+
+def _fingerprint_candidate(entry, sample_size, include_middle, algo):
+    """Fingerprints one FileEntry; module-level so worker processes can run it."""
+    return compute_fingerprint(entry.path, entry.size, sample_size, include_middle, algo)
+
+
+def group_by_fingerprint(candidates, sample_size=DEFAULT_SAMPLE_SIZE, include_middle=False, algo="md5",
+                         workers=1, executor="thread", ipc_batch=DEFAULT_IPC_BATCH, cache=None):
+    """
+    Fingerprints same-size FileEntry candidates and drops those whose (size, fingerprint)
+    is unique. Files too small to sample are passed through untouched, and fingerprints
+    in cache ({path: (signature, fingerprint)}) are reused when the file is unchanged.
+    A fingerprint stored under another name of the same inode (a hardlink target, or
+    the old name of a renamed file) is found by stat signature and reused as well.
+    Returns (candidates, fingerprints, pruned_count, copied) where fingerprints holds
+    the (entry, fingerprint) pairs that were freshly computed and copied those reused
+    from another path, which still need storing under entry.path.
+    """
+    cache = cache or {}
+    by_signature = {sig: fingerprint for sig, fingerprint in cache.values()}
+    keys = {}
+    copied = []
+    to_sample = []
+    for entry in candidates:
+        if sample_offsets(entry.size, sample_size, include_middle) is None:
+            continue
+        stored = cache.get(entry.path)
+        if stored and stored[0] == signature(entry):
+            keys[entry.path] = (entry.size, stored[1])
+        elif signature(entry) in by_signature:
+            copied.append((entry, by_signature[signature(entry)]))
+            keys[entry.path] = (entry.size, by_signature[signature(entry)])
+        else:
+            to_sample.append(entry)
+
+    results = ordered_map(
+        partial(_fingerprint_candidate, sample_size=sample_size, include_middle=include_middle, algo=algo),
+        to_sample, workers, executor=executor, ipc_batch=ipc_batch
+    )
+
+    fingerprints = []
+    for entry, fingerprint in results:
+        if fingerprint:
+            fingerprints.append((entry, fingerprint))
+            keys[entry.path] = (entry.size, fingerprint)
+
+    key_counts = Counter(keys.values())
+    kept = [entry for entry in candidates
+            if entry.path not in keys or key_counts[keys[entry.path]] > 1]
+    return kept, fingerprints, len(candidates) - len(kept), copied
+
+
+def _recording(entries, walked):
+    """Yields entries, adding each path to the walked set."""
+    try:
+        for entry in entries:
+            walked.add(entry.path)
+            yield entry
+    finally:
+        entries.close()
+
+
+def prune_unwalked(db_path, directory, walked, stored_paths, allowed_exts=None, excluded_dirs=None):
+    """
+    Deletes the stored rows of files a finished scan of directory no longer found,
+    i.e. files deleted or moved away since an earlier scan. Only paths the scan could
+    have walked are considered: under directory, outside excluded directories, and
+    with an allowed extension. Returns the number of paths purged.
+    """
+    prefix = os.path.join(os.fspath(directory), "")
+    gone = []
+    for path in stored_paths:
+        if path in walked or not path.startswith(prefix):
+            continue
+        if allowed_exts and os.path.splitext(path)[1].lower() not in allowed_exts:
+            continue
+        if excluded_dirs and any(part in excluded_dirs for part in path[len(prefix):].split(os.sep)[:-1]):
+            continue
+        gone.append(path)
+    purge_paths(db_path, gone)
+    return len(gone)
+
+
+def find_duplicates(directory, db_path, filetypes_path=None, debug=False, batch_size=DEFAULT_COMMIT_SIZE,
+                    hash_algo="md5", size_prune=True, sample_size=DEFAULT_SAMPLE_SIZE,
+                    sample_middle=False, workers=1, executor="thread", ipc_batch=DEFAULT_IPC_BATCH,
+                    full_rescan=False, excluded_path=None, walkers=1, buffer_size=DEFAULT_BUFFER_SIZE,
+                    use_mmap=False, include_hardlinks=False, pipeline=False, resume=False,
+                    metrics=None):
+    """
+    Scans a directory, filters by filetypes, and stores hashes and paths in normalized DB.
+    With size_prune enabled, files whose byte size is unique are never hashed since
+    they cannot have a duplicate. Same-size files larger than the sampled blocks are
+    then fingerprinted from their head/tail (and middle with sample_middle) so only
+    fingerprint collisions get a full read; sample_size=0 disables that stage.
+    Reads are spread over `workers` threads, or processes with executor="process"
+    (better for trees of many tiny files); results are stored in walk order.
+    Rows are written through one BulkWriter connection, batch_size rows per transaction.
+    On a rescan, files whose size, mtime, inode and device match a stored row (their
+    own, or that of a renamed file or another link to the inode) reuse the stored hash
+    and fingerprint without being opened, unless full_rescan is set.
+    Directories named in the excluded_path file are never descended into, and
+    `walkers` threads list directories concurrently.
+    Paths sharing an inode with another walked path are hashed once and recorded in the
+    hardlinks table; unless include_hardlinks is set they are left out of file_paths,
+    since they take no extra space and are not reclaimable duplicates.
+    With pipeline set, walking, hashing and DB writes run as concurrent stages joined
+    by bounded queues (see core.scan_pipeline); the stored rows are the same.
+    Each scan is recorded in the scans table and checkpoints its walk as it goes (see
+    core.scan_checkpoint). With resume, an interrupted scan of the same directory
+    continues from its checkpoint; hashes it already committed are reused like on a rescan.
+    Once a scan completes, stored rows of files under directory that it no longer found
+    are deleted (see prune_unwalked); results["removed"] counts them.
+    With metrics (a core.scan_metrics.ScanMetrics), per-stage times, files and bytes, stat
+    calls and DB commit latencies are recorded into it (see core.scan_metrics).
+    A finished scan rebuilds the duplicate_groups / duplicate_summary tables that reports
+    and the viewer read; results["wasted_bytes"] is the space its duplicates take up.
+    Raises ValueError if db_path already holds hashes made with a different algorithm,
+    since those can never be compared with the new ones.
+    """
+    if hash_algo not in HASH_ALGORITHMS:
+        raise ValueError(f"Unsupported hashing algorithm: {hash_algo}")
+
     allowed_exts = load_filetypes(filetypes_path) if filetypes_path else None
+    excluded_dirs = load_excluded_dirs(excluded_path) if excluded_path else None
 
+    hash_cache = {}
+    fingerprint_cache = {}
+    walk_counts = {"scanned": 0, "skipped": 0}
+    walked = set()
+    scan_id = None
     if db_path:
         create_db(db_path)
+        other_algos = stored_hash_algorithms(db_path) - {hash_algo}
+        if other_algos:
+            raise ValueError(
+                f"{db_path} holds hashes made with {', '.join(sorted(map(str, other_algos)))}; "
+                f"refusing to mix them with {hash_algo}. Use a new database or the same --hash-algo."
+            )
+        hash_cache = load_hash_cache(db_path)
+        if not full_rescan:
+            fingerprint_cache = load_fingerprint_cache(db_path, sample_size, sample_middle, hash_algo)
+
+        # A checkpoint is only valid for a walk with the same filters
+        walk_options = {
+            "filetypes": sorted(allowed_exts) if allowed_exts else None,
+            "excluded_dirs": sorted(excluded_dirs) if excluded_dirs else None,
+        }
+        scan_id, _ = begin_scan(db_path, directory, walk_options, resume)
+        entries = _recording(checkpointed_walk(db_path, scan_id, directory, allowed_exts, excluded_dirs,
+                                               walkers, walk_counts, debug), walked)
+    else:
+        entries = walk_file_entries(directory, allowed_exts, excluded_dirs, walkers, walk_counts, debug)
 
-    scanned = 0
-    skipped = 0
+    try:
+        if pipeline:
+            results = run_pipeline(
+                directory, db_path, walkers=walkers, hash_algo=hash_algo, size_prune=size_prune,
+                sample_size=sample_size, sample_middle=sample_middle, workers=workers, executor=executor,
+                ipc_batch=ipc_batch, buffer_size=buffer_size, use_mmap=use_mmap,
+                include_hardlinks=include_hardlinks, full_rescan=full_rescan, hash_cache=hash_cache,
+                fingerprint_cache=fingerprint_cache, batch_size=batch_size, debug=debug, entries=entries,
+                metrics=metrics
+            )
+        else:
+            with metrics.stage("walk") if metrics else nullcontext():
+                entries = list(entries)
+            if metrics:
+                metrics.add("walk", len(entries))
+            results = _serial_scan(
+                entries, db_path, hash_algo, size_prune, sample_size, sample_middle, workers,
+                executor, ipc_batch, buffer_size, use_mmap, include_hardlinks, full_rescan,
+                hash_cache, fingerprint_cache, batch_size, debug, metrics
+            )
+        stat_calls = walk_counts.pop("stat_calls", 0)
+        if metrics:
+            metrics.stat_calls += stat_calls
+        results.update(walk_counts)
+        if scan_id is not None:
+            results["removed"] = prune_unwalked(db_path, directory, walked, set(hash_cache) | set(fingerprint_cache),
+                                                allowed_exts, excluded_dirs)
+            if debug and results["removed"]:
+                logger.debug(f"[GONE] {results['removed']} stored paths were not found by this scan")
+    except BaseException as e:
+        if scan_id is not None:
+            finish_scan(db_path, scan_id, "interrupted" if isinstance(e, KeyboardInterrupt) else "failed")
+        raise
+
+    if scan_id is not None:
+        finish_scan(db_path, scan_id, "finished", results)
+        with metrics.stage("summary") if metrics else nullcontext():
+            summary = rebuild_duplicate_summary(db_path)
+        results["wasted_bytes"] = summary["wasted_bytes"]
+    if metrics:
+        metrics.finish(results)
+    _log_summary(results)
+    return results
+
+
+def _serial_scan(entries, db_path, hash_algo, size_prune, sample_size, sample_middle, workers, executor,
+                 ipc_batch, buffer_size, use_mmap, include_hardlinks, full_rescan, hash_cache,
+                 fingerprint_cache, batch_size, debug, metrics=None):
+    """
+    The stage-by-stage scan behind find_duplicates: every walked entry is known before
+    size grouping starts. Returns the summary dict without the walk counts.
+    """
     hashed = 0
-    batch = []
-
-    for file_path in walk_files(directory):
-        scanned += 1
-        _, ext = os.path.splitext(file_path)
-
-        if allowed_exts and ext.lower() not in allowed_exts:
-            skipped += 1
+    cached = 0
+    unique_size = 0
+    fingerprinted = 0
+    unique_fingerprint = 0
+    bytes_saved = 0
+    linked = {}
+
+    entries, links = split_hardlinks(entries)
+    if include_hardlinks:
+        # Links stay in the scan but are hashed once per inode, through their target
+        linked = {entry.path: target for entry, target in links}
+        entries += [entry for entry, _ in links]
+    if debug and links:
+        logger.debug(f"[LINK] {len(links)} paths are hardlinks of another walked path")
+
+    # Rows whose file changed since the last scan are stale whatever happens next, and
+    # excluded hardlinks may have been stored as copies by an older scan. A full rescan
+    # distrusts every stored row: a file rewritten without a size or mtime change would
+    # otherwise keep its old hash next to the new one, or keep it unchallenged if pruned.
+    stale = [entry.path for entry in entries
+             if entry.path in hash_cache and (full_rescan or hash_cache[entry.path][0] != signature(entry))]
+    if not include_hardlinks:
+        stale += [entry.path for entry, _ in links if entry.path in hash_cache or entry.path in fingerprint_cache]
+    if stale:
+        purge_paths(db_path, stale)
+        if debug:
+            logger.debug(f"[STALE] {len(stale)} stored paths changed since the last scan")
+    store_hardlinks_in_db(db_path, links, metrics)
+
+    candidates = entries
+    if size_prune:
+        candidates, unique_size = group_by_size(entries)
+        if debug:
+            logger.debug(f"[SIZE] {unique_size} files have a unique size and were not hashed")
+
+        if sample_size:
+            sizes = {entry.path: entry.size for entry in candidates}
+            with metrics.stage("fingerprint") if metrics else nullcontext():
+                candidates, fingerprints, unique_fingerprint, copied = group_by_fingerprint(
+                    candidates, sample_size, sample_middle, hash_algo, workers, executor, ipc_batch,
+                    cache=fingerprint_cache
+                )
+            fingerprinted = len(fingerprints)
+            if metrics:
+                metrics.add("fingerprint", fingerprinted, fingerprinted * sample_size * (3 if sample_middle else 2))
+            kept = {entry.path for entry in candidates}
+            bytes_saved = sum(size for path, size in sizes.items() if path not in kept)
+            store_fingerprints_in_db(db_path, fingerprints + copied, sample_size, sample_middle, hash_algo, metrics)
             if debug:
-                logger.debug(f"[SKIP] {file_path} (filtered by extension)")
-            continue
-
-        file_hash = compute_hash(file_path, hash_algo)
-        if file_hash:
-            batch.append((file_hash, file_path))
-            hashed += 1
+                logger.debug(f"[FPRINT] {unique_fingerprint} of {len(sizes)} same-size files "
+                             f"have a unique fingerprint and were not fully read")
+
+    # Stored hashes by stat signature: also catches renamed files and other links to a stored inode
+    signature_cache = {} if full_rescan else {sig: h for sig, h in hash_cache.values() if sig}
+    to_hash = []
+    reused = []
+    link_entries = []
+    for entry in candidates:
+        stored = hash_cache.get(entry.path)
+        if not full_rescan and stored and stored[0] == signature(entry):
+            cached += 1
             if debug:
-                logger.debug(f"[HASH] {file_path} → {file_hash}")
-
-        if len(batch) >= batch_size:
-            store_batch_in_db(db_path, batch)
-            batch = []
-
-    if batch:
-        store_batch_in_db(db_path, batch)
-
-    logger.info("✅ Scan complete.")
-    logger.info(f"  Total scanned: {scanned}")
-    logger.info(f"  Skipped (filtered): {skipped}")
-    logger.info(f"  Files hashed/stored: {hashed}")
+                logger.debug(f"[CACHE] {entry.path} → {stored[1]}")
+        elif signature(entry) in signature_cache:
+            cached += 1
+            reused.append((signature_cache[signature(entry)], *entry))
+        elif entry.path in linked:
+            link_entries.append(entry)
+        else:
+            to_hash.append(entry)
+
+    inode_hashes = {}
+    writer = BulkWriter(db_path, batch_size, hash_algo, metrics) if db_path else None
+
+    def store(row):
+        if writer:
+            writer.add(row)
+
+    hash_start = time.perf_counter()
+    try:
+        for row in reused:
+            store(row)
+        results = hash_files((entry.path for entry in to_hash), hash_algo, workers,
+                             executor=executor, ipc_batch=ipc_batch, buffer_size=buffer_size,
+                             use_mmap=use_mmap)
+        for entry, (file_path, file_hash) in zip(to_hash, results):
+            if file_hash:
+                store((file_hash, *entry))
+                inode_hashes[(entry.device, entry.inode)] = file_hash
+                hashed += 1
+                if metrics:
+                    metrics.add("hash", 1, entry.size)
+                if debug:
+                    logger.debug(f"[HASH] {file_path} → {file_hash}")
+
+        for entry in link_entries:
+            file_hash = inode_hashes.get((entry.device, entry.inode))
+            if file_hash is None:
+                stored = hash_cache.get(linked[entry.path])
+                file_hash = stored[1] if stored else compute_hash(entry.path, hash_algo, buffer_size, use_mmap)
+            if file_hash:
+                store((file_hash, *entry))
+    finally:
+        # Commit whatever was hashed, even if the scan was interrupted
+        if writer:
+            writer.close()
+        if metrics:
+            metrics.add("hash", seconds=time.perf_counter() - hash_start)
 
     return {
-        "scanned": scanned,
-        "skipped": skipped,
+        "hardlinks": len(links),
+        "unique_size": unique_size,
+        "fingerprinted": fingerprinted,
+        "unique_fingerprint": unique_fingerprint,
+        "bytes_saved": bytes_saved,
+        "cached": cached,
         "hashed": hashed
     }
 
 
+def _log_summary(results):
+    logger.info("✅ Scan complete.")
+    logger.info(f"  Total scanned: {results['scanned']}")
+    logger.info(f"  Skipped (filtered): {results['skipped']}")
+    logger.info(f"  Hardlinks (hashed once per inode): {results['hardlinks']}")
+    logger.info(f"  Skipped (unique size): {results['unique_size']}")
+    logger.info(f"  Fingerprinted: {results['fingerprinted']}")
+    logger.info(f"  Skipped (unique fingerprint): {results['unique_fingerprint']} "
+                f"({results['bytes_saved']} bytes not read)")
+    logger.info(f"  Reused from cache: {results['cached']}")
+    logger.info(f"  Files hashed/stored: {results['hashed']}")
+    if "removed" in results:
+        logger.info(f"  Removed (no longer found): {results['removed']}")
+    if "wasted_bytes" in results:
+        logger.info(f"  Wasted by duplicates: {results['wasted_bytes']} bytes")
+
+
 def print_database_contents(db_path):
     """Prints all hash → path mappings from the normalized database."""
     try:
@@ -110,27 +482,25 @@ def generate_report(db_path):
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
 
-        cursor.execute("SELECT COUNT(*) FROM file_paths")
-        total_files = cursor.fetchone()[0]
-
-        cursor.execute("SELECT COUNT(*) FROM hashes")
-        unique_hashes = cursor.fetchone()[0]
-
-        cursor.execute("""
-            SELECT COUNT(*) FROM (
-                SELECT hash FROM file_paths
-                GROUP BY hash
-                HAVING COUNT(path) > 1
-            )
-        """)
-        duplicate_groups = cursor.fetchone()[0]
-
-        cursor.execute("""
-            SELECT MAX(cnt) FROM (
-                SELECT COUNT(path) AS cnt FROM file_paths GROUP BY hash
-            )
-        """)
-        max_copies = cursor.fetchone()[0] or 0
+        # The summary table kept by each scan; aggregate file_paths only if it is stale
+        summary = read_duplicate_summary(conn)
+        if summary is None:
+            cursor.execute("SELECT COUNT(*), COUNT(DISTINCT hash) FROM file_paths")
+            total_files, unique_hashes = cursor.fetchone()
+
+            cursor.execute("""
+                SELECT COUNT(*), MAX(cnt), SUM(wasted) FROM (
+                    SELECT COUNT(path) AS cnt, COALESCE(MAX(size), 0) * (COUNT(path) - 1) AS wasted
+                    FROM file_paths
+                    GROUP BY hash
+                    HAVING COUNT(path) > 1
+                )
+            """)
+            duplicate_groups, max_copies, wasted = cursor.fetchone()
+            max_copies = max_copies or min(total_files, 1)
+        else:
+            total_files, unique_hashes = summary["files"], summary["hashes"]
+            duplicate_groups, max_copies, wasted = summary["groups"], summary["max_copies"], summary["wasted_bytes"]
 
         print("\n📊 Duplicate Report")
         print("-" * 30)
@@ -138,6 +508,7 @@ def generate_report(db_path):
         print(f"Unique hashes:       {unique_hashes}")
         print(f"Duplicate groups:    {duplicate_groups}")
         print(f"Most copies of one:  {max_copies}")
+        print(f"Wasted bytes:        {wasted or 0}")
 
         conn.close()
     except Exception as e:
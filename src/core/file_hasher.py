@@ -1,31 +1,151 @@
 import hashlib
 import logging
+import mmap
+import os
+import threading
 
 # Setup logger for this module
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+# Bytes read from each sampled region when fingerprinting
+DEFAULT_SAMPLE_SIZE = 4096
 
-def compute_hash(file_path, algo="md5"):
+# Read buffer for full hashes; files no larger than this are hashed with a single read
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+# Per-thread read buffers, reused across files instead of allocating a bytes object per chunk
+_buffers = threading.local()
+
+
+def _read_buffer(buffer_size):
+    """Returns this thread's reusable buffer of buffer_size bytes as a memoryview."""
+    buf = getattr(_buffers, "buf", None)
+    if buf is None or len(buf) != buffer_size:
+        buf = memoryview(bytearray(buffer_size))
+        _buffers.buf = buf
+    return buf
+
+
+# Registry of hash algorithm name -> factory returning a fresh hashlib-style object
+HASH_ALGORITHMS = {}
+
+
+def register_hash_algorithm(name, factory):
+    """Makes a hash algorithm available to compute_hash and --hash-algo."""
+    HASH_ALGORITHMS[name] = factory
+
+
+register_hash_algorithm("md5", hashlib.md5)
+register_hash_algorithm("sha256", hashlib.sha256)
+register_hash_algorithm("blake2b", hashlib.blake2b)
+
+# Optional fast hashes, registered only when their packages are installed
+try:
+    import xxhash
+    register_hash_algorithm("xxh3_128", xxhash.xxh3_128)
+except ImportError:
+    pass
+
+try:
+    import blake3
+    register_hash_algorithm("blake3", blake3.blake3)
+except ImportError:
+    pass
+
+
+def _new_hash(algo):
+    """Returns a fresh hash object for algo, or None if it is unsupported."""
+    factory = HASH_ALGORITHMS.get(algo)
+    if factory is None:
+        logger.error(f"Unsupported hashing algorithm: {algo}")
+        return None
+    return factory()
+
+
+def compute_hash(file_path, algo="md5", buffer_size=DEFAULT_BUFFER_SIZE, use_mmap=False):
     """
-    Compute the hash of a file using the specified algorithm (md5 or sha256).
-    Returns the hex digest string or None on failure.
+    Compute the hash of a file using the specified algorithm (any name in HASH_ALGORITHMS).
+    Small files are hashed from a single read; larger ones are read with readinto()
+    into a reused buffer of buffer_size bytes, or hashed straight from an mmap of the
+    file when use_mmap is set, so no new bytes object is allocated per chunk.
+    Returns the hex digest string or None on failure; raises ValueError for a
+    buffer_size below 1, which would read nothing and hash every file as empty.
     """
+    if buffer_size < 1:
+        raise ValueError(f"buffer_size must be at least 1, got {buffer_size}")
     try:
-        if algo == "md5":
-            hash_func = hashlib.md5()
-        elif algo == "sha256":
-            hash_func = hashlib.sha256()
-        else:
-            logger.error(f"Unsupported hashing algorithm: {algo}")
+        hash_func = _new_hash(algo)
+        if hash_func is None:
             return None
 
-        with open(file_path, "rb") as f:
-            while chunk := f.read(8192):
-                hash_func.update(chunk)
+        with open(file_path, "rb", buffering=0) as f:
+            size = os.fstat(f.fileno()).st_size
+
+            if size <= buffer_size:
+                hash_func.update(f.read())
+            elif use_mmap:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    view = memoryview(mapped)
+                    try:
+                        for offset in range(0, size, buffer_size):
+                            hash_func.update(view[offset:offset + buffer_size])
+                    finally:
+                        view.release()
+            else:
+                buf = _read_buffer(buffer_size)
+                while n := f.readinto(buf):
+                    hash_func.update(buf[:n])
 
         return hash_func.hexdigest()
 
     except Exception as e:
         logger.error(f"Error hashing {file_path}: {e}")
         return None
+
+
+def sample_offsets(size, sample_size=DEFAULT_SAMPLE_SIZE, include_middle=False):
+    """
+    Returns the offsets of the head, (middle) and tail blocks sampled from a file
+    of the given size, or None when the blocks would cover the whole file anyway.
+    """
+    blocks = 3 if include_middle else 2
+    if sample_size <= 0 or size <= sample_size * blocks:
+        return None
+
+    offsets = [0]
+    if include_middle:
+        offsets.append((size - sample_size) // 2)
+    offsets.append(size - sample_size)
+    return offsets
+
+
+def compute_fingerprint(file_path, size=None, sample_size=DEFAULT_SAMPLE_SIZE,
+                        include_middle=False, algo="md5"):
+    """
+    Compute a cheap fingerprint from the head, tail and optionally middle block of a file.
+    Files with different fingerprints cannot be identical, so only collisions need a full hash.
+    Returns the hex digest string or None on failure (or if the file is too small to sample).
+    """
+    try:
+        if size is None:
+            size = os.path.getsize(file_path)
+
+        offsets = sample_offsets(size, sample_size, include_middle)
+        if offsets is None:
+            return None
+
+        hash_func = _new_hash(algo)
+        if hash_func is None:
+            return None
+
+        with open(file_path, "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                hash_func.update(f.read(sample_size))
+
+        return hash_func.hexdigest()
+
+    except Exception as e:
+        logger.error(f"Error fingerprinting {file_path}: {e}")
+        return None
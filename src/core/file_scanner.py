@@ -1,10 +1,34 @@
 import os
 import logging
-from pathlib import Path
+import queue
+import threading
+from collections import namedtuple, deque
 
 
 logger = logging.getLogger(__name__)
 
+# A walked file plus the stat fields later stages need (size grouping, rescan cache)
+FileEntry = namedtuple("FileEntry", ["path", "size", "mtime_ns", "inode", "device"])
+
+
+def stat_entry(file):
+    """
+    Stats a path or os.DirEntry and returns its FileEntry. DirEntry objects reuse the
+    stat result cached by scandir. Raises OSError if the file is gone.
+    """
+    if isinstance(file, os.DirEntry):
+        st = file.stat()
+        path = file.path
+    else:
+        st = os.stat(file)
+        path = str(file)
+    return FileEntry(path, st.st_size, st.st_mtime_ns, st.st_ino, st.st_dev)
+
+
+def signature(entry):
+    """Returns the (size, mtime_ns, inode, device) tuple used to detect unchanged files."""
+    return (entry.size, entry.mtime_ns, entry.inode, entry.device)
+
 def load_filetypes(filetypes_path):
     """Loads allowed filetypes from a text file."""
     try:
@@ -24,35 +48,214 @@ def load_excluded_dirs(excluded_path):
         logger.error(f"Error reading excluded dirs from {excluded_path}: {e}")
         return set()
 
-def walk_files(directory, included_filetypes=None, excluded_dirs=None, debug=False):
+def list_dir(current, included_filetypes, excluded_dirs, debug):
     """
-    Recursively walk through directory and yield matching file paths.
+    Lists one directory. Returns (subdirs, files, entries_seen) where files are the
+    os.DirEntry objects that pass the filters.
+    """
+    subdirs = []
+    files = []
+    seen = 0
+    try:
+        with os.scandir(current) as it:
+            for entry in it:
+                seen += 1
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if excluded_dirs and entry.name in excluded_dirs:
+                            if debug:
+                                logger.debug(f"[DIR-SKIP] {entry.path}")
+                            continue
+                        subdirs.append(entry.path)
+
+                    elif entry.is_file():
+                        if included_filetypes and \
+                                os.path.splitext(entry.name)[1].lower() not in included_filetypes:
+                            if debug:
+                                logger.debug(f"[EXT-SKIP] {entry.path}")
+                            continue
+                        files.append(entry)
+                except OSError as e:
+                    logger.error(f"Error reading {entry.path}: {e}")
+    except OSError as e:
+        logger.error(f"Error listing {current}: {e}")
+    return subdirs, files, seen
+
+
+class WorkStealingQueue:
+    """
+    Per-worker deques of pending directories. A worker pops its own newest directory
+    (depth-first, cache friendly) and, when it runs dry, steals the oldest directory
+    from another worker, which tends to be the root of a large unexplored subtree.
+    """
+
+    def __init__(self, workers):
+        self.deques = [deque() for _ in range(workers)]
+        self.pending = 0
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def push(self, worker, items):
+        with self.cond:
+            self.deques[worker].extend(items)
+            self.pending += len(items)
+            self.cond.notify_all()
+
+    def pop(self, worker):
+        """Returns the next directory for worker, or None once every directory is done."""
+        with self.cond:
+            while True:
+                if self.closed:
+                    return None
+                own = self.deques[worker]
+                if own:
+                    return own.pop()
+                for victim in self.deques:
+                    if victim:
+                        return victim.popleft()
+                if self.pending == 0:
+                    return None
+                self.cond.wait()
+
+    def task_done(self):
+        with self.cond:
+            self.pending -= 1
+            if self.pending == 0:
+                self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+def _parallel_walk(roots, included_filetypes, excluded_dirs, debug, walkers):
+    """Lists directories on `walkers` threads and yields each listing as it arrives (see walk_dirs)."""
+    work = WorkStealingQueue(walkers)
+    results = queue.Queue(maxsize=walkers * 4)
+    stop = threading.Event()
+
+    def put(item):
+        # Bounded hand-off; give up if the consumer has gone away
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def worker(index):
+        try:
+            while not stop.is_set():
+                current = work.pop(index)
+                if current is None:
+                    break
+                try:
+                    subdirs, files, seen = list_dir(current, included_filetypes, excluded_dirs, debug)
+                    # Hand the listing over before sharing its subdirectories, so a
+                    # directory always reaches the consumer before any of its children
+                    put((current, subdirs, files, seen))
+                    work.push(index, subdirs)
+                finally:
+                    work.task_done()
+        finally:
+            put(None)
+
+    work.push(0, roots)
+    threads = [threading.Thread(target=worker, args=(i,), name=f"walker-{i}", daemon=True)
+               for i in range(walkers)]
+    for thread in threads:
+        thread.start()
+
+    finished = 0
+    try:
+        while finished < walkers:
+            listing = results.get()
+            if listing is None:
+                finished += 1
+                continue
+            yield listing
+    finally:
+        stop.set()
+        work.close()
+        for thread in threads:
+            thread.join()
+
+
+def walk_dirs(roots, included_filetypes=None, excluded_dirs=None, debug=False, walkers=1):
+    """
+    Lists every directory under roots (a list of directories) and yields
+    (directory, subdirs, files, entries_seen) per directory, with the filters of
+    list_dir. A directory is always yielded before its subdirectories are, so a
+    caller can record its progress per directory (e.g. a checkpointed walk).
+    - walkers: number of threads listing directories concurrently, sharing the
+      pending directories through a WorkStealingQueue; useful on high-latency
+      filesystems (NFS/SMB) where each readdir is a round-trip
+    """
+    roots = [os.fspath(root) for root in roots]
+    if walkers > 1:
+        yield from _parallel_walk(roots, included_filetypes, excluded_dirs, debug, walkers)
+        return
+
+    stack = roots
+    while stack:
+        current = stack.pop()
+        subdirs, files, seen = list_dir(current, included_filetypes, excluded_dirs, debug)
+        stack.extend(subdirs)
+        yield current, subdirs, files, seen
+
+
+def walk_entries(directory, included_filetypes=None, excluded_dirs=None, debug=False, walkers=1):
+    """
+    Recursively walk through directory with os.scandir and yield an os.DirEntry per matching file.
+    Entry types come from the cached readdir info, so no extra stat is issued per entry, and
+    excluded directories are pruned before they are descended into. Symlinked
+    directories are not followed.
     - included_filetypes: set of extensions (e.g. {'.txt', '.jpg'})
     - excluded_dirs: set of directory names to skip
     - debug: if True, log skipped files
+    - walkers: number of threads listing directories concurrently (see walk_dirs)
     """
-    directory = Path(directory)
     scanned = 0
     yielded = 0
+    for _, _, files, seen in walk_dirs([directory], included_filetypes, excluded_dirs, debug, walkers):
+        scanned += seen
+        yielded += len(files)
+        yield from files
 
-    for entry in directory.rglob("*"):
-        scanned += 1
+    logger.info(f"Walked {scanned} entries, yielded {yielded} matching files")
 
-        if entry.is_dir():
-            if excluded_dirs and entry.name in excluded_dirs:
-                if debug:
-                    logger.debug(f"[DIR-SKIP] {entry}")
-                continue
 
-        elif entry.is_file():
-            if included_filetypes and entry.suffix.lower() not in included_filetypes:
-                if debug:
-                    logger.debug(f"[EXT-SKIP] {entry}")
-                continue
+def walk_files(directory, included_filetypes=None, excluded_dirs=None, debug=False, walkers=1):
+    """
+    Recursively walk through directory and yield matching file paths.
+    See walk_entries for the filtering options.
+    """
+    for entry in walk_entries(directory, included_filetypes, excluded_dirs, debug, walkers):
+        yield entry.path
 
-            yielded += 1
-            yield str(entry)
 
-    logger.info(f"Walked {scanned} entries, yielded {yielded} matching files")
+def walk_file_entries(directory, allowed_exts=None, excluded_dirs=None, walkers=1, counts=None, debug=False):
+    """
+    Walks directory and yields the FileEntry of each file whose extension is in
+    allowed_exts (every file if None). counts["scanned"] and counts["skipped"] are
+    increased per file walked and per file filtered out by extension, and
+    counts["stat_calls"] per file stat'ed; files that vanish before they are stat'ed
+    are logged and dropped.
+    """
+    counts = counts if counts is not None else {"scanned": 0, "skipped": 0}
+    for dir_entry in walk_entries(directory, excluded_dirs=excluded_dirs, debug=debug, walkers=walkers):
+        counts["scanned"] += 1
+        _, ext = os.path.splitext(dir_entry.name)
 
+        if allowed_exts and ext.lower() not in allowed_exts:
+            counts["skipped"] += 1
+            if debug:
+                logger.debug(f"[SKIP] {dir_entry.path} (filtered by extension)")
+            continue
 
+        counts["stat_calls"] = counts.get("stat_calls", 0) + 1
+        try:
+            yield stat_entry(dir_entry)
+        except OSError as e:
+            logger.error(f"Error reading stat of {dir_entry.path}: {e}")
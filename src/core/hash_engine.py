@@ -0,0 +1,89 @@
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+
+from core.file_hasher import compute_hash, DEFAULT_BUFFER_SIZE
+
+logger = logging.getLogger(__name__)
+
+EXECUTORS = ("thread", "process")
+
+# Items sent to a worker process per task in process mode
+DEFAULT_IPC_BATCH = 256
+
+
+def _apply_batch(func, batch):
+    """Runs func over a batch inside a worker process and returns the results as one list."""
+    return [func(item) for item in batch]
+
+
+def _batched(items, size):
+    """Yields lists of up to size items from an iterable."""
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def ordered_map(func, items, workers=1, max_pending=None, executor="thread", ipc_batch=DEFAULT_IPC_BATCH):
+    """
+    Applies func to every item on a bounded worker pool and yields (item, result)
+    in input order, regardless of which call finishes first.
+    At most max_pending tasks (default: 4 per worker) are in flight at once, so
+    items are pulled from the iterable lazily and memory stays bounded.
+    With executor="process", items are shipped to worker processes in batches of
+    ipc_batch so pickling overhead stays small; func must then be picklable.
+    Raises ValueError for an ipc_batch below 1, which would form no batch at all.
+    """
+    if ipc_batch < 1:
+        raise ValueError(f"ipc_batch must be at least 1, got {ipc_batch}")
+    if workers <= 1:
+        for item in items:
+            yield item, func(item)
+        return
+
+    if executor not in EXECUTORS:
+        raise ValueError(f"Unsupported executor: {executor}")
+
+    max_pending = max_pending or workers * 4
+    pending = deque()
+
+    if executor == "process":
+        pool = ProcessPoolExecutor(max_workers=workers)
+        tasks = _batched(items, ipc_batch)
+        submit = partial(pool.submit, _apply_batch, func)
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hasher")
+        tasks = items
+        submit = partial(pool.submit, func)
+
+    def drain(task, future):
+        if executor == "process":
+            yield from zip(task, future.result())
+        else:
+            yield task, future.result()
+
+    with pool:
+        try:
+            for task in tasks:
+                if len(pending) >= max_pending:
+                    yield from drain(*pending.popleft())
+                pending.append((task, submit(task)))
+
+            while pending:
+                yield from drain(*pending.popleft())
+        finally:
+            # Consumer stopped early (error or Ctrl-C): drop queued work
+            for _, future in pending:
+                future.cancel()
+
+
+def hash_files(file_paths, algo="md5", workers=1, max_pending=None, executor="thread",
+               ipc_batch=DEFAULT_IPC_BATCH, buffer_size=DEFAULT_BUFFER_SIZE, use_mmap=False):
+    """
+    Hashes files with compute_hash on a pool of worker threads or processes.
+    Yields (path, hash) in the same order as file_paths; hash is None on failure.
+    """
+    hasher = partial(compute_hash, algo=algo, buffer_size=buffer_size, use_mmap=use_mmap)
+    return ordered_map(hasher, file_paths, workers, max_pending, executor, ipc_batch)
@@ -0,0 +1,84 @@
+import cProfile
+import io
+import logging
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Rows in the hot-function and memory reports
+DEFAULT_PROFILE_TOP = 25
+
+# Stack frames kept per allocation; more gives better tracebacks but slows tracemalloc down
+TRACEMALLOC_FRAMES = 1
+
+
+def hot_functions(profile, top=DEFAULT_PROFILE_TOP, sort="cumulative"):
+    """The top functions of a cProfile.Profile as pstats text, sorted by sort."""
+    out = io.StringIO()
+    stats = pstats.Stats(profile, stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+    return out.getvalue()
+
+
+def memory_top(snapshot, top=DEFAULT_PROFILE_TOP):
+    """The source lines holding the most memory in a tracemalloc snapshot, one per line."""
+    stats = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ]).statistics("lineno")
+    lines = [f"{i:>3}. {stat.traceback[0].filename}:{stat.traceback[0].lineno}  "
+             f"{stat.size / 1024:.1f} KiB in {stat.count} blocks"
+             for i, stat in enumerate(stats[:top], 1)]
+    rest = stats[top:]
+    if rest:
+        lines.append(f"     ... {len(rest)} more lines holding {sum(s.size for s in rest) / 1024:.1f} KiB")
+    return "\n".join(lines)
+
+
+@contextmanager
+def profiled(output_prefix, top=DEFAULT_PROFILE_TOP, label="operation"):
+    """
+    Runs the body under cProfile and tracemalloc, then writes:
+
+        <output_prefix>.prof  raw profile, for pstats, snakeviz or gprof2dot
+        <output_prefix>.txt   hot functions by cumulative and by own time, plus the
+                              top memory-holding lines and the traced peak
+
+    cProfile only sees the thread that entered the block, so with --workers or
+    --pipeline the hashing threads show up as time spent waiting on them; tracemalloc
+    traces allocations from every thread. The reports are written even if the body
+    raises (including Ctrl-C), so an aborted slow run can still be inspected.
+    """
+    profile = cProfile.Profile()
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+    start = time.perf_counter()
+    profile.enable()
+    try:
+        yield profile
+    finally:
+        profile.disable()
+        elapsed = time.perf_counter() - start
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        profile.dump_stats(f"{output_prefix}.prof")
+        report = [
+            f"Profile of {label}: {elapsed:.3f}s wall",
+            "",
+            f"== Hot functions by cumulative time (top {top}) ==",
+            hot_functions(profile, top, "cumulative"),
+            f"== Hot functions by own time (top {top}) ==",
+            hot_functions(profile, top, "tottime"),
+            f"== Memory: {current / 1024 / 1024:.1f} MiB still allocated, "
+            f"{peak / 1024 / 1024:.1f} MiB traced peak ==",
+            memory_top(snapshot, top),
+            "",
+        ]
+        with open(f"{output_prefix}.txt", "w") as f:
+            f.write("\n".join(report))
+        logger.info(f"Profile written to {output_prefix}.txt and {output_prefix}.prof")
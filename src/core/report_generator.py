@@ -1,26 +1,81 @@
+import io
 import sqlite3
+import sys
 
-def generate_report(db_path):
-    """Generates and returns a human-readable summary of duplicates."""
+from db_utils.db_utils import read_duplicate_summary
+
+# Duplicate groups computed from file_paths, for databases whose summary tables are stale
+LIVE_GROUPS = """
+    SELECT hash, COUNT(*) AS copies, MAX(size) AS size, COALESCE(MAX(size), 0) * (COUNT(*) - 1) AS wasted
+    FROM file_paths
+    GROUP BY hash
+    HAVING COUNT(*) > 1
+"""
+
+# Report orders, largest first: reclaimable bytes, bytes per copy, or number of copies
+REPORT_SORTS = ("wasted", "size", "copies")
+
+
+def iter_report_lines(conn, top=None, min_copies=2, sort="wasted"):
+    """
+    Yields the report one line at a time: totals, then each group with at least
+    min_copies copies (the top `top` by sort, or all of them) followed by its paths.
+    Groups come from the duplicate_groups table kept by each scan, or from file_paths
+    when that is stale; each group's paths are read by hash from the index, so memory
+    use does not grow with the size of the database.
+    """
+    if sort not in REPORT_SORTS:
+        raise ValueError(f"Unsupported sort: {sort}")
+
+    summary = read_duplicate_summary(conn)
+    groups = "duplicate_groups" if summary is not None else f"({LIVE_GROUPS})"
+    if summary is None:
+        summary = dict(zip(("groups", "wasted_bytes"), conn.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(wasted), 0) FROM {groups}"
+        ).fetchone()))
+
+    yield "📊 Duplicate Report"
+    yield "=" * 50
+    yield f"Duplicate groups: {summary['groups']}"
+    yield f"Wasted bytes:     {summary['wasted_bytes']}"
+    if top or min_copies > 2:
+        yield (f"Showing {f'top {top}' if top else 'all'} groups with {max(2, min_copies)}+ copies "
+               f"by {sort}")
+
+    rows = conn.execute(
+        f"SELECT hash, copies, size, wasted FROM {groups} WHERE copies >= ? "
+        f"ORDER BY {sort} DESC, hash DESC LIMIT ?",
+        (max(2, min_copies), top if top else -1)
+    )
+    for hash_val, copies, size, wasted in rows:
+        yield ""
+        yield f"Hash: {hash_val}  ({copies} copies × {size or 0} bytes, {wasted} bytes wasted)"
+        for (path,) in conn.execute("SELECT path FROM file_paths WHERE hash = ? ORDER BY path", (hash_val,)):
+            yield f"  - {path}"
+
+
+def write_report(db_path, out=None, top=None, min_copies=2, sort="wasted"):
+    """
+    Writes the duplicate report to the file object out (stdout by default) as it is
+    read from the database. Returns True on success, False on a database error.
+    """
+    out = out or sys.stdout
     try:
         conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT hash, GROUP_CONCAT(path, '; ') FROM file_paths
-            GROUP BY hash HAVING COUNT(path) > 1
-        """)
-        duplicates = cursor.fetchall()
-
-        report_lines = ["📊 Duplicate Report", "=" * 50]
-        for hash_val, paths in duplicates:
-            report_lines.append(f"\nHash: {hash_val}")
-            for path in paths.split("; "):
-                report_lines.append(f"  - {path}")
-        
-        conn.close()
-        return "\n".join(report_lines)
-    except Exception as e:
+        try:
+            for line in iter_report_lines(conn, top, min_copies, sort):
+                out.write(line + "\n")
+        finally:
+            conn.close()
+        return True
+    except sqlite3.Error as e:
         print(f"Error generating report: {e}")
-        return None
+        return False
+
 
+def generate_report(db_path, top=None, min_copies=2, sort="wasted"):
+    """Returns the duplicate report as one string (see write_report), or None on error."""
+    buffer = io.StringIO()
+    if not write_report(db_path, buffer, top, min_copies, sort):
+        return None
+    return buffer.getvalue().rstrip("\n")
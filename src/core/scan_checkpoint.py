@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime
+
+from core.file_scanner import FileEntry, walk_dirs, stat_entry
+
+logger = logging.getLogger(__name__)
+
+# Walked files buffered before their directories are marked listed in one transaction
+CHECKPOINT_FILES = 5000
+
+# Checkpoint writes share the DB with the scan's BulkWriter; wait this long for its commits
+CHECKPOINT_TIMEOUT = 60
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=CHECKPOINT_TIMEOUT)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _drop_checkpoint(conn, scan_id):
+    conn.execute("DELETE FROM scan_dirs WHERE scan_id = ?", (scan_id,))
+    conn.execute("DELETE FROM scan_files WHERE scan_id = ?", (scan_id,))
+
+
+def begin_scan(db_path, directory, options, resume=False):
+    """
+    Records the start of a scan of directory and returns (scan_id, resumed).
+    With resume, the latest unfinished scan of the same root with the same options
+    is continued from its checkpoint; otherwise unfinished scans of that root are
+    marked abandoned and their checkpoints dropped.
+    """
+    root = os.path.abspath(directory)
+    options = json.dumps(options, sort_keys=True)
+    conn = _connect(db_path)
+    try:
+        with conn:
+            unfinished = conn.execute(
+                "SELECT id, options, started_at FROM scans WHERE root = ? AND finished_at IS NULL ORDER BY id DESC",
+                (root,)
+            ).fetchall()
+
+            if resume and unfinished and unfinished[0][1] == options:
+                scan_id, _, started_at = unfinished[0]
+                conn.execute("UPDATE scans SET status = 'running', resumed_at = ? WHERE id = ?", (_now(), scan_id))
+                listed, pending, files = conn.execute('''
+                    SELECT SUM(listed), COUNT(*) - SUM(listed),
+                           (SELECT COUNT(*) FROM scan_files WHERE scan_id = ?)
+                    FROM scan_dirs WHERE scan_id = ?
+                ''', (scan_id, scan_id)).fetchone()
+                logger.info(f"Resuming scan #{scan_id} of {root} started {started_at}: "
+                            f"{listed or 0} directories listed, {pending or 0} to go, {files} files checkpointed")
+                return scan_id, True
+
+            if resume:
+                if unfinished:
+                    logger.warning(f"Unfinished scan #{unfinished[0][0]} of {root} used different options; "
+                                   f"starting a new scan")
+                else:
+                    logger.info(f"No unfinished scan of {root} to resume; starting a new scan")
+            elif unfinished:
+                logger.info(f"Discarding checkpoint of unfinished scan #{unfinished[0][0]} of {root} "
+                            f"(use --resume to continue it)")
+
+            for scan_id, _, _ in unfinished:
+                conn.execute("UPDATE scans SET status = 'abandoned' WHERE id = ?", (scan_id,))
+                _drop_checkpoint(conn, scan_id)
+
+            cursor = conn.execute(
+                "INSERT INTO scans (root, options, status, started_at) VALUES (?, ?, 'running', ?)",
+                (root, options, _now())
+            )
+            return cursor.lastrowid, False
+    finally:
+        conn.close()
+
+
+def finish_scan(db_path, scan_id, status="finished", results=None):
+    """
+    Records how a scan ended. Only a finished scan gets finished_at and loses its
+    checkpoint; an interrupted or failed one keeps it for --resume.
+    """
+    conn = _connect(db_path)
+    try:
+        with conn:
+            if status == "finished":
+                conn.execute(
+                    "UPDATE scans SET status = ?, finished_at = ?, results = ? WHERE id = ?",
+                    (status, _now(), json.dumps(results) if results else None, scan_id)
+                )
+                _drop_checkpoint(conn, scan_id)
+            else:
+                conn.execute("UPDATE scans SET status = ? WHERE id = ?", (status, scan_id))
+    finally:
+        conn.close()
+
+
+def _save_listed(conn, scan_id, listed):
+    """Marks listed directories done, together with their files and newly found subdirectories."""
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO scan_files (scan_id, path, size, mtime_ns, inode, device) VALUES (?, ?, ?, ?, ?, ?)",
+            [(scan_id, *entry) for _, _, kept, _, _ in listed for entry in kept]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO scan_dirs (scan_id, path) VALUES (?, ?)",
+            [(scan_id, subdir) for _, subdirs, _, _, _ in listed for subdir in subdirs]
+        )
+        conn.executemany(
+            "UPDATE scan_dirs SET listed = 1, files = ?, skipped = ? WHERE scan_id = ? AND path = ?",
+            [(files, skipped, scan_id, current) for current, _, _, files, skipped in listed]
+        )
+
+
+def checkpointed_walk(db_path, scan_id, directory, allowed_exts=None, excluded_dirs=None, walkers=1,
+                      counts=None, debug=False, checkpoint_files=None):
+    """
+    Walks directory like walk_entries and yields a stat'ed FileEntry per file that
+    passes allowed_exts, while checkpointing the walk into the scan tables. Listing
+    goes through walk_dirs, so walkers > 1 shares directories by work stealing.
+
+    Files found by an earlier run of the same scan are replayed from scan_files, and
+    only directories not yet marked listed are read from disk. A directory is marked
+    listed in the same transaction that stores its files and subdirectories, so a
+    crash at any point loses at most the last checkpoint_files files of listing work.
+    counts["scanned"] and counts["skipped"] are increased for the whole walk,
+    replayed part included; counts["stat_calls"] only for files stat'ed by this run.
+    """
+    counts = counts if counts is not None else {"scanned": 0, "skipped": 0}
+    checkpoint_files = checkpoint_files or CHECKPOINT_FILES
+    conn = _connect(db_path)
+    try:
+        scanned, skipped = conn.execute(
+            "SELECT COALESCE(SUM(files), 0), COALESCE(SUM(skipped), 0) FROM scan_dirs WHERE scan_id = ? AND listed = 1",
+            (scan_id,)
+        ).fetchone()
+        counts["scanned"] += scanned
+        counts["skipped"] += skipped
+
+        replay = conn.execute(
+            "SELECT path, size, mtime_ns, inode, device FROM scan_files WHERE scan_id = ? ORDER BY rowid",
+            (scan_id,)
+        )
+        yield from (FileEntry(*row) for row in replay)
+
+        stack = [row[0] for row in conn.execute(
+            "SELECT path FROM scan_dirs WHERE scan_id = ? AND listed = 0", (scan_id,)
+        )]
+        if not stack and not conn.execute("SELECT 1 FROM scan_dirs WHERE scan_id = ?", (scan_id,)).fetchone():
+            stack = [os.fspath(directory)]
+            with conn:
+                conn.execute("INSERT INTO scan_dirs (scan_id, path) VALUES (?, ?)", (scan_id, stack[0]))
+
+        listed = []
+        buffered = 0
+        for current, subdirs, files, _ in walk_dirs(stack, None, excluded_dirs, debug, walkers):
+            kept = []
+            skip = 0
+            for dir_entry in files:
+                _, ext = os.path.splitext(dir_entry.name)
+                if allowed_exts and ext.lower() not in allowed_exts:
+                    skip += 1
+                    if debug:
+                        logger.debug(f"[SKIP] {dir_entry.path} (filtered by extension)")
+                    continue
+                try:
+                    kept.append(stat_entry(dir_entry))
+                except OSError as e:
+                    logger.error(f"Error reading stat of {dir_entry.path}: {e}")
+
+            counts["scanned"] += len(files)
+            counts["skipped"] += skip
+            counts["stat_calls"] = counts.get("stat_calls", 0) + len(files) - skip
+            listed.append((current, subdirs, kept, len(files), skip))
+            buffered += len(kept) + 1
+            yield from kept
+
+            if buffered >= checkpoint_files:
+                _save_listed(conn, scan_id, listed)
+                listed = []
+                buffered = 0
+
+        if listed:
+            _save_listed(conn, scan_id, listed)
+    finally:
+        conn.close()
@@ -0,0 +1,172 @@
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Upper bounds (seconds) of the DB commit latency histogram buckets
+COMMIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+PROMETHEUS_PREFIX = "duplicate_finder"
+
+# Scan results that are byte totals, not file counts: exported as their own gauges
+BYTE_RESULTS = {
+    "bytes_saved": ("scan_unread_bytes", "Bytes of files never read in full thanks to size and fingerprint pruning."),
+    "wasted_bytes": ("scan_wasted_bytes", "Bytes taken up by duplicate copies after the last scan."),
+}
+
+
+def peak_rss_bytes(who="self"):
+    """Peak resident set size of this process ("self") or of its finished children, or None."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in KiB on Linux but bytes on macOS
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+class ScanMetrics:
+    """
+    Per-stage timings and throughput for one scan, plus a DB commit latency histogram.
+    Stages are timed with stage(name); files and bytes are credited with add().
+    In pipeline mode stages overlap, so their times can add up to more than the wall time.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.wall_seconds = None
+        self.stages = {}
+        self.stat_calls = 0
+        self.commit_buckets = [0] * (len(COMMIT_BUCKETS) + 1)
+        self.commit_count = 0
+        self.commit_rows = 0
+        self.commit_seconds = 0.0
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def _stage(self, name):
+        return self.stages.setdefault(name, {"seconds": 0.0, "files": 0, "bytes": 0})
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self._stage(name)["seconds"] += time.perf_counter() - start
+
+    def add(self, name, files=0, size=0, seconds=0.0):
+        with self.lock:
+            stage = self._stage(name)
+            stage["files"] += files
+            stage["bytes"] += size
+            stage["seconds"] += seconds
+
+    def observe_commit(self, seconds, rows):
+        with self.lock:
+            self.commit_buckets[bisect_left(COMMIT_BUCKETS, seconds)] += 1
+            self.commit_count += 1
+            self.commit_rows += rows
+            self.commit_seconds += seconds
+
+    def finish(self, results):
+        self.wall_seconds = time.perf_counter() - self.started
+        self.results = dict(results)
+
+    def to_dict(self):
+        stages = {}
+        for name, stage in self.stages.items():
+            seconds = stage["seconds"]
+            stages[name] = {
+                **stage,
+                "seconds": round(seconds, 6),
+                "files_per_sec": round(stage["files"] / seconds, 1) if seconds else None,
+                "bytes_per_sec": round(stage["bytes"] / seconds, 1) if seconds else None,
+            }
+
+        cumulative = 0
+        histogram = {}
+        for bound, count in zip(list(COMMIT_BUCKETS) + ["+Inf"], self.commit_buckets):
+            cumulative += count
+            histogram[str(bound)] = cumulative
+
+        return {
+            "wall_seconds": round(self.wall_seconds or time.perf_counter() - self.started, 6),
+            "results": self.results,
+            "stages": stages,
+            "stat_calls": self.stat_calls,
+            "db_commits": {
+                "count": self.commit_count,
+                "rows": self.commit_rows,
+                "seconds": round(self.commit_seconds, 6),
+                "latency_histogram": histogram,
+            },
+            "peak_rss_bytes": peak_rss_bytes("self"),
+            "peak_rss_children_bytes": peak_rss_bytes("children"),
+        }
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def to_prometheus(self):
+        """Renders the metrics in the Prometheus text exposition format."""
+        data = self.to_dict()
+        p = PROMETHEUS_PREFIX
+        lines = [
+            f"# HELP {p}_scan_wall_seconds Wall time of the last scan.",
+            f"# TYPE {p}_scan_wall_seconds gauge",
+            f"{p}_scan_wall_seconds {data['wall_seconds']}",
+            f"# HELP {p}_scan_files Files per outcome in the last scan.",
+            f"# TYPE {p}_scan_files gauge",
+        ]
+        lines += [f'{p}_scan_files{{outcome="{key}"}} {value}'
+                  for key, value in data["results"].items() if key not in BYTE_RESULTS]
+        for key, (metric, help_text) in BYTE_RESULTS.items():
+            if key in data["results"]:
+                lines += [f"# HELP {p}_{metric} {help_text}", f"# TYPE {p}_{metric} gauge",
+                          f"{p}_{metric} {data['results'][key]}"]
+
+        for metric, field, help_text in (
+            ("stage_seconds", "seconds", "Time spent in each scan stage."),
+            ("stage_files", "files", "Files processed by each scan stage."),
+            ("stage_bytes", "bytes", "Bytes read by each scan stage."),
+        ):
+            lines += [f"# HELP {p}_{metric} {help_text}", f"# TYPE {p}_{metric} gauge"]
+            lines += [f'{p}_{metric}{{stage="{name}"}} {stage[field]}' for name, stage in data["stages"].items()]
+
+        commits = data["db_commits"]
+        lines += [
+            f"# HELP {p}_stat_calls Files stat'ed by the walk.",
+            f"# TYPE {p}_stat_calls gauge",
+            f"{p}_stat_calls {data['stat_calls']}",
+            f"# HELP {p}_db_commit_seconds Latency of DB write transactions.",
+            f"# TYPE {p}_db_commit_seconds histogram",
+        ]
+        lines += [f'{p}_db_commit_seconds_bucket{{le="{bound}"}} {count}'
+                  for bound, count in commits["latency_histogram"].items()]
+        lines += [
+            f"{p}_db_commit_seconds_sum {commits['seconds']}",
+            f"{p}_db_commit_seconds_count {commits['count']}",
+        ]
+        for who in ("", "_children"):
+            value = data[f"peak_rss{who}_bytes"]
+            if value is not None:
+                lines += [f"# TYPE {p}_peak_rss{who}_bytes gauge", f"{p}_peak_rss{who}_bytes {value}"]
+        lines += [f"# TYPE {p}_last_scan_timestamp_seconds gauge", f"{p}_last_scan_timestamp_seconds {time.time():.0f}"]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Writes the textfile atomically, as node_exporter's textfile collector expects."""
+        partial = f"{path}.{os.getpid()}.tmp"
+        with open(partial, "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(partial, path)
@@ -0,0 +1,328 @@
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+
+from core.file_scanner import walk_file_entries, signature
+from core.file_hasher import compute_hash, compute_fingerprint, sample_offsets, DEFAULT_SAMPLE_SIZE, DEFAULT_BUFFER_SIZE
+from core.hash_engine import hash_files, ordered_map, DEFAULT_IPC_BATCH
+from db_utils.db_utils import BulkWriter, DEFAULT_COMMIT_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Items buffered between two stages before the faster one has to wait
+DEFAULT_QUEUE_SIZE = 1024
+
+# Fresh fingerprints sent to the writer per message
+FINGERPRINT_BATCH = 512
+
+# Stale paths deleted per purge message
+PURGE_BATCH = 512
+
+_DONE = object()
+_MISSING = object()
+
+
+def _hold_until_collision(held, key, entry):
+    """
+    Streams entries out as soon as their key is shared. The first entry of a key is
+    held back; when a second one arrives both are released, and later ones pass
+    straight through. Returns the entries to release now.
+    """
+    first = held.get(key, _MISSING)
+    if first is _MISSING:
+        held[key] = entry
+        return ()
+    if first is None:
+        return (entry,)
+    held[key] = None
+    return (first, entry)
+
+
+def run_pipeline(directory, db_path, allowed_exts=None, excluded_dirs=None, walkers=1, hash_algo="md5",
+                 size_prune=True, sample_size=DEFAULT_SAMPLE_SIZE, sample_middle=False, workers=1,
+                 executor="thread", ipc_batch=DEFAULT_IPC_BATCH, buffer_size=DEFAULT_BUFFER_SIZE,
+                 use_mmap=False, include_hardlinks=False, full_rescan=False, hash_cache=None,
+                 fingerprint_cache=None, batch_size=DEFAULT_COMMIT_SIZE, queue_size=DEFAULT_QUEUE_SIZE,
+                 debug=False, entries=None, metrics=None):
+    """
+    Runs a scan as overlapping stages instead of walk-then-hash-then-store:
+
+        walker thread → [queue] → size / fingerprint filters → hasher pool → [queue] → DB writer thread
+
+    Unique-size and unique-fingerprint files are still never fully read: each filter holds
+    the first file of a key back and releases it once a second file shares the key, so
+    hashing starts while the tree is still being walked. The writer thread owns the only
+    DB connection and commits batch_size rows per transaction.
+    On an error in any stage, or Ctrl-C, the walker is stopped, rows already hashed are
+    committed, and the exception is re-raised. Stores the same rows as the serial scan
+    and returns the same summary dict.
+    entries, if given, is a FileEntry generator run on the walker thread instead of
+    walking directory (e.g. a checkpointed walk); it does its own scanned/skipped counting.
+    With metrics (a core.scan_metrics.ScanMetrics), the walk, fingerprint, hash and write
+    stages are timed on their own threads, so their times overlap.
+    """
+    hash_cache = hash_cache or {}
+    fingerprint_cache = fingerprint_cache or {}
+    counts = dict.fromkeys([
+        "scanned", "skipped", "hardlinks", "unique_size", "fingerprinted",
+        "unique_fingerprint", "bytes_saved", "cached", "hashed"
+    ], 0)
+
+    stop = threading.Event()
+    errors = []
+    walk_q = queue.Queue(maxsize=queue_size)
+    write_q = queue.Queue(maxsize=queue_size)
+
+    def fail():
+        raise errors[0] if errors else RuntimeError("Scan pipeline stopped")
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    stale_paths = []
+
+    def send(method, *args):
+        """Queues a BulkWriter call for the writer thread, after any stale paths still to purge."""
+        if stale_paths and method != "purge":
+            purge = stale_paths[:]
+            stale_paths.clear()
+            send("purge", purge)
+        if db_path and not put(write_q, (method, args)):
+            fail()
+
+    def purge_later(path):
+        """Batches purges so a full rescan does not commit once per file."""
+        stale_paths.append(path)
+        if len(stale_paths) >= PURGE_BATCH:
+            send("purge", stale_paths[:])
+            stale_paths.clear()
+
+    def walker():
+        walk = entries if entries is not None else walk_file_entries(
+            directory, allowed_exts, excluded_dirs, walkers, counts, debug
+        )
+        walked_files = 0
+        start = time.perf_counter()
+        try:
+            for entry in walk:
+                walked_files += 1
+                if not put(walk_q, entry):
+                    break
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            walk.close()
+            put(walk_q, _DONE)
+            if metrics:
+                metrics.add("walk", walked_files, seconds=time.perf_counter() - start)
+
+    def writer():
+        start = time.perf_counter()
+        try:
+            with BulkWriter(db_path, batch_size, hash_algo, metrics) as bulk:
+                while (item := write_q.get()) is not _DONE:
+                    method, args = item
+                    getattr(bulk, method)(*args)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            if metrics:
+                metrics.add("write", seconds=time.perf_counter() - start)
+
+    def walked():
+        while True:
+            try:
+                item = walk_q.get(timeout=0.1)
+            except queue.Empty:
+                if stop.is_set():
+                    fail()
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+    inode_first = {}
+    link_groups = defaultdict(list)
+
+    def unlinked(stream):
+        for entry in stream:
+            stored = hash_cache.get(entry.path)
+            # A full rescan rewrites every stored row, so the old hash never lingers beside the new one
+            if stored and (full_rescan or stored[0] != signature(entry)):
+                purge_later(entry.path)
+
+            key = (entry.device, entry.inode)
+            if entry.inode and key in inode_first:
+                link_groups[key].append(entry)
+                counts["hardlinks"] += 1
+                if not include_hardlinks:
+                    continue
+            elif entry.inode:
+                inode_first[key] = entry
+            yield entry
+
+    def size_collisions(stream):
+        held = {}
+        for entry in stream:
+            yield from _hold_until_collision(held, entry.size, entry)
+        counts["unique_size"] = sum(1 for entry in held.values() if entry is not None)
+
+    fingerprint_signatures = {sig: fp for sig, fp in fingerprint_cache.values()}
+
+    def fingerprint(entry):
+        """
+        Returns (fingerprint, store): store is "fresh" for a computed fingerprint, "copied"
+        for one reused from another path of the inode (see group_by_fingerprint), else
+        None. fingerprint is None for files too small to sample.
+        """
+        if sample_offsets(entry.size, sample_size, sample_middle) is None:
+            return None, None
+        cached = fingerprint_cache.get(entry.path)
+        if cached and cached[0] == signature(entry):
+            return cached[1], None
+        if signature(entry) in fingerprint_signatures:
+            return fingerprint_signatures[signature(entry)], "copied"
+        if not metrics:
+            return compute_fingerprint(entry.path, entry.size, sample_size, sample_middle, hash_algo), "fresh"
+        with metrics.stage("fingerprint"):
+            fp = compute_fingerprint(entry.path, entry.size, sample_size, sample_middle, hash_algo)
+        metrics.add("fingerprint", 1, sample_size * (3 if sample_middle else 2))
+        return fp, "fresh"
+
+    def fingerprint_collisions(stream):
+        held = {}
+        fresh_batch = []
+        for entry, (fp, store) in ordered_map(fingerprint, stream, workers):
+            if fp is None:
+                yield entry
+                continue
+            if store:
+                counts["fingerprinted"] += store == "fresh"
+                fresh_batch.append((entry, fp))
+                if len(fresh_batch) >= FINGERPRINT_BATCH:
+                    send("add_fingerprints", fresh_batch, sample_size, sample_middle)
+                    fresh_batch = []
+            yield from _hold_until_collision(held, (entry.size, fp), entry)
+
+        if fresh_batch:
+            send("add_fingerprints", fresh_batch, sample_size, sample_middle)
+        pruned = [entry for entry in held.values() if entry is not None]
+        counts["unique_fingerprint"] = len(pruned)
+        counts["bytes_saved"] = sum(entry.size for entry in pruned)
+
+    # Stored hashes by stat signature: also catches renamed files and other links to a stored inode
+    signature_cache = {} if full_rescan else {sig: h for sig, h in hash_cache.values() if sig}
+    inode_hashes = {}
+    in_flight = set()
+    waiting = defaultdict(list)
+    pending = deque()
+
+    def needs_hash(stream):
+        for entry in stream:
+            key = (entry.device, entry.inode)
+            stored = hash_cache.get(entry.path)
+            if not full_rescan and stored and stored[0] == signature(entry):
+                counts["cached"] += 1
+                inode_hashes[key] = stored[1]
+                continue
+            if signature(entry) in signature_cache:
+                counts["cached"] += 1
+                inode_hashes[key] = signature_cache[signature(entry)]
+                send("add", (inode_hashes[key], *entry))
+                continue
+
+            if include_hardlinks and entry.inode:
+                # Hash each inode once; other links wait for its result
+                if key in inode_hashes:
+                    send("add", (inode_hashes[key], *entry))
+                    continue
+                if key in in_flight:
+                    waiting[key].append(entry)
+                    continue
+                in_flight.add(key)
+
+            pending.append(entry)
+            yield entry.path
+
+    walk_thread = threading.Thread(target=walker, name="scan-walker", daemon=True)
+    write_thread = threading.Thread(target=writer, name="scan-writer", daemon=True)
+    walk_thread.start()
+    if db_path:
+        write_thread.start()
+
+    results = None
+    hash_start = time.perf_counter()
+    try:
+        stream = unlinked(walked())
+        if size_prune:
+            stream = size_collisions(stream)
+            if sample_size:
+                stream = fingerprint_collisions(stream)
+
+        results = hash_files(needs_hash(stream), hash_algo, workers, executor=executor,
+                             ipc_batch=ipc_batch, buffer_size=buffer_size, use_mmap=use_mmap)
+        for file_path, file_hash in results:
+            entry = pending.popleft()
+            key = (entry.device, entry.inode)
+            if file_hash:
+                counts["hashed"] += 1
+                if metrics:
+                    metrics.add("hash", 1, entry.size)
+                inode_hashes[key] = file_hash
+                send("add", (file_hash, *entry))
+                if debug:
+                    logger.debug(f"[HASH] {file_path} → {file_hash}")
+            for link in waiting.pop(key, []):
+                link_hash = file_hash or compute_hash(link.path, hash_algo, buffer_size, use_mmap)
+                if link_hash:
+                    send("add", (link_hash, *link))
+
+        # Link targets are the smallest path of each inode, as in the serial scan; the
+        # stream saw some other path first, so move its row over to the target
+        links = []
+        for key, group in link_groups.items():
+            first = inode_first[key]
+            target = min([first.path] + [entry.path for entry in group])
+            links += [(entry, target) for entry in [first] + group if entry.path != target]
+            if not include_hardlinks:
+                send("purge", [entry.path for entry in group if entry.path != target
+                               and (entry.path in hash_cache or entry.path in fingerprint_cache)])
+                if first.path != target:
+                    send("rename", first.path, target)
+        if links:
+            send("add_hardlinks", links)
+        if stale_paths:
+            send("purge", stale_paths[:])
+    except BaseException:
+        if results is not None:
+            results.close()
+        raise
+    finally:
+        stop.set()
+        walk_thread.join()
+        # Let the writer commit everything queued so far, even on error or Ctrl-C
+        while write_thread.is_alive():
+            try:
+                write_q.put(_DONE, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        if db_path:
+            write_thread.join()
+        if metrics:
+            metrics.add("hash", seconds=time.perf_counter() - hash_start)
+            metrics.stat_calls += counts.pop("stat_calls", 0)
+
+    if errors:
+        raise errors[0]
+    return counts
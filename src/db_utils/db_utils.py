@@ -1,46 +1,496 @@
 import sqlite3
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Rows written per transaction by BulkWriter
+DEFAULT_COMMIT_SIZE = 10000
+
+# Stat signature stored next to each path so unchanged files can skip rehashing
+STAT_COLUMNS = {
+    "size": "INTEGER",
+    "mtime_ns": "INTEGER",
+    "inode": "INTEGER",
+    "device": "INTEGER",
+}
+
+# Rows from before algorithms were recorded could only be md5 or sha256
+LEGACY_ALGO = "CASE length(hash) WHEN 32 THEN 'md5' WHEN 64 THEN 'sha256' END"
 
-def create_db(db_path):
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
 
-    # Create hashes table
+def _add_missing_columns(cursor, table, columns):
+    """Adds any of the given {name: type} columns that an older table lacks."""
+    existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    for name, col_type in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {col_type}")
+
+
+def _has_unique_index(cursor, table, columns):
+    """True if table already has a UNIQUE constraint or index over exactly these columns."""
+    for row in cursor.execute(f"PRAGMA index_list({table})").fetchall():
+        name, unique = row[1], row[2]
+        if unique:
+            indexed = [info[2] for info in cursor.execute(f"PRAGMA index_info({name})").fetchall()]
+            if indexed == list(columns):
+                return True
+    return False
+
+
+def _migrate_base_tables(c):
+    """v1: the original hashes and file_paths tables."""
     c.execute('''
         CREATE TABLE IF NOT EXISTS hashes (
             hash TEXT PRIMARY KEY
         )
     ''')
 
-    # Create file_paths table
     c.execute('''
         CREATE TABLE IF NOT EXISTS file_paths (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             hash TEXT,
             path TEXT,
-            FOREIGN KEY (hash) REFERENCES hashes(hash)
+            size INTEGER,
+            mtime_ns INTEGER,
+            inode INTEGER,
+            device INTEGER,
+            algo TEXT,
+            FOREIGN KEY (hash) REFERENCES hashes(hash),
+            UNIQUE (hash, path)
         )
     ''')
 
-    conn.commit()
-    conn.close()
+
+def _migrate_stat_signatures(c):
+    """v2: per-path stat signature and the fingerprints table."""
+    _add_missing_columns(c, "file_paths", STAT_COLUMNS)
+
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS fingerprints (
+            path TEXT PRIMARY KEY,
+            size INTEGER,
+            fingerprint TEXT
+        )
+    ''')
+    _add_missing_columns(c, "fingerprints", {
+        "mtime_ns": "INTEGER",
+        "inode": "INTEGER",
+        "device": "INTEGER",
+        "sample_size": "INTEGER",
+        "sample_middle": "INTEGER",
+    })
+
+
+def _migrate_hash_algorithms(c):
+    """v3: record the algorithm behind every hash and fingerprint."""
+    _add_missing_columns(c, "file_paths", {"algo": "TEXT"})
+    _add_missing_columns(c, "fingerprints", {"algo": "TEXT"})
+
+    c.execute(f"UPDATE file_paths SET algo = {LEGACY_ALGO} WHERE algo IS NULL")
+
+
+def _migrate_hardlinks(c):
+    """v4: paths sharing an inode with an already walked target."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS hardlinks (
+            path TEXT PRIMARY KEY,
+            target TEXT,
+            inode INTEGER,
+            device INTEGER
+        )
+    ''')
 
 
-def store_hash_in_db(db_path, file_hash, file_path):
+def _migrate_indexes(c):
+    """
+    v5: UNIQUE(hash, path) plus an index on path. Lookups by hash use the leading
+    column of the unique index, so hash needs no index of its own.
+    """
+    # Older tables lack the constraint: drop repeated rows, then enforce it with an index
+    if not _has_unique_index(c, "file_paths", ("hash", "path")):
+        c.execute("DELETE FROM file_paths WHERE rowid NOT IN (SELECT MIN(rowid) FROM file_paths GROUP BY hash, path)")
+        c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_file_paths_hash_path ON file_paths(hash, path)")
+
+    c.execute("CREATE INDEX IF NOT EXISTS idx_file_paths_path ON file_paths(path)")
+
+
+def _migrate_scans(c):
+    """
+    v6: one row per scan with start/finish markers, plus the walk checkpoint of unfinished
+    scans: directories still to list (listed = 0) and the files found so far.
+    """
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS scans (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            root TEXT,
+            options TEXT,
+            status TEXT,
+            started_at TEXT,
+            resumed_at TEXT,
+            finished_at TEXT,
+            results TEXT
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS scan_dirs (
+            scan_id INTEGER,
+            path TEXT,
+            listed INTEGER DEFAULT 0,
+            files INTEGER DEFAULT 0,
+            skipped INTEGER DEFAULT 0,
+            PRIMARY KEY (scan_id, path)
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS scan_files (
+            scan_id INTEGER,
+            path TEXT,
+            size INTEGER,
+            mtime_ns INTEGER,
+            inode INTEGER,
+            device INTEGER,
+            PRIMARY KEY (scan_id, path)
+        )
+    ''')
+
+
+def _rebuild_duplicate_summary(c):
+    """Recomputes duplicate_groups and the duplicate_summary row from file_paths."""
+    c.execute("DELETE FROM duplicate_groups")
+    c.execute('''
+        INSERT INTO duplicate_groups (hash, copies, size, wasted)
+        SELECT hash, COUNT(*), MAX(size), COALESCE(MAX(size), 0) * (COUNT(*) - 1)
+        FROM file_paths
+        GROUP BY hash
+        HAVING COUNT(*) > 1
+    ''')
+    c.execute('''
+        INSERT OR REPLACE INTO duplicate_summary
+        (id, hashes, files, group_count, duplicate_files, wasted_bytes, max_copies, stale, updated_at)
+        SELECT 1, totals.hashes, totals.files, COUNT(g.hash), COALESCE(SUM(g.copies), 0),
+               COALESCE(SUM(g.wasted), 0), COALESCE(MAX(g.copies), MIN(totals.files, 1)),
+               0, datetime('now')
+        FROM (SELECT COUNT(DISTINCT hash) AS hashes, COUNT(*) AS files FROM file_paths) AS totals
+        LEFT JOIN duplicate_groups AS g ON 1
+    ''')
+
+
+def _migrate_duplicate_summary(c):
+    """
+    v7: duplicate_groups holds every hash stored under two or more paths with its copies,
+    bytes per copy and wasted bytes ((copies - 1) * size); duplicate_summary holds their
+    totals in a single row. Both are rebuilt at the end of each scan so reports and the
+    viewer need not re-aggregate file_paths; stale = 1 marks them out of date after
+    other writes.
+    """
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS duplicate_groups (
+            hash TEXT PRIMARY KEY,
+            copies INTEGER,
+            size INTEGER,
+            wasted INTEGER
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_duplicate_groups_copies ON duplicate_groups(copies, hash)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_duplicate_groups_wasted ON duplicate_groups(wasted, hash)")
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS duplicate_summary (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            hashes INTEGER,
+            files INTEGER,
+            group_count INTEGER,
+            duplicate_files INTEGER,
+            wasted_bytes INTEGER,
+            max_copies INTEGER,
+            stale INTEGER DEFAULT 1,
+            updated_at TEXT
+        )
+    ''')
+    _rebuild_duplicate_summary(c)
+
+
+# Ordered schema migrations; a database at PRAGMA user_version N has run the first N.
+# Every step tolerates tables that already have its changes, since databases written
+# before versioning start at user_version 0.
+MIGRATIONS = [
+    _migrate_base_tables,
+    _migrate_stat_signatures,
+    _migrate_hash_algorithms,
+    _migrate_hardlinks,
+    _migrate_indexes,
+    _migrate_scans,
+    _migrate_duplicate_summary,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(db_path):
+    """Returns the PRAGMA user_version of a database."""
     conn = sqlite3.connect(db_path)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    conn.close()
+    return version
+
+
+def migrate_db(db_path):
+    """
+    Brings a database up to SCHEMA_VERSION, one migration per transaction.
+    Returns the version the database started at.
+    """
+    # Manage transactions explicitly so DDL is rolled back along with the version bump
+    conn = sqlite3.connect(db_path, isolation_level=None)
     c = conn.cursor()
+    start = c.execute("PRAGMA user_version").fetchone()[0]
+
+    try:
+        for version in range(start, SCHEMA_VERSION):
+            c.execute("BEGIN")
+            MIGRATIONS[version](c)
+            c.execute(f"PRAGMA user_version = {version + 1}")
+            c.execute("COMMIT")
+            logger.debug(f"Migrated {db_path} to schema v{version + 1}")
+    except Exception:
+        if conn.in_transaction:
+            c.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    return start
+
+
+def create_db(db_path):
+    """Creates the database, or upgrades an existing one to the current schema."""
+    migrate_db(db_path)
+
+
+def mark_summary_stale(c):
+    """Flags the duplicate summary as out of date, if the database has one."""
+    try:
+        c.execute("UPDATE duplicate_summary SET stale = 1 WHERE stale = 0")
+    except sqlite3.OperationalError:
+        pass  # database from before v7
+
+
+def rebuild_duplicate_summary(db_path, timeout=60):
+    """
+    Recomputes the duplicate_groups and duplicate_summary tables from file_paths in one
+    transaction and returns the summary (see read_duplicate_summary).
+    """
+    conn = sqlite3.connect(db_path, timeout=timeout)
+    try:
+        with conn:
+            _rebuild_duplicate_summary(conn)
+        return read_duplicate_summary(conn)
+    finally:
+        conn.close()
+
+
+def read_duplicate_summary(conn):
+    """
+    Returns the duplicate_summary row as {"hashes", "files", "groups", "duplicate_files",
+    "wasted_bytes", "max_copies"}, or None if it is missing or stale, in which case
+    callers aggregate file_paths themselves.
+    """
+    try:
+        row = conn.execute('''
+            SELECT hashes, files, group_count, duplicate_files, wasted_bytes, max_copies
+            FROM duplicate_summary WHERE id = 1 AND stale = 0
+        ''').fetchone()
+    except sqlite3.OperationalError:
+        return None
+    if row is None:
+        return None
+    return dict(zip(("hashes", "files", "groups", "duplicate_files", "wasted_bytes", "max_copies"), row))
+
+
+def store_hash_in_db(db_path, file_hash, file_path, hash_algo="md5"):
+    """
+    Stores one hash → path mapping made with hash_algo, without a stat signature.
+    Goes through BulkWriter, so an existing (hash, path) row is updated in place
+    and the duplicate summary is marked stale.
+    """
+    with BulkWriter(db_path, commit_size=1, hash_algo=hash_algo) as writer:
+        writer.add((file_hash, file_path, None, None, None, None))
 
-    print(f"Inserting hash: {file_hash}, path: {file_path}")  # 👈 Add this for debugging
 
-    # Step 1: Insert hash if it doesn't exist
-    c.execute('INSERT OR IGNORE INTO hashes (hash) VALUES (?)', (file_hash,))
+class BulkWriter:
+    """
+    Writes hashed files to the database over one connection kept open for a whole scan.
+    Rows are buffered and flushed with executemany every commit_size rows, in WAL mode,
+    and the UNIQUE(hash, path) constraint replaces a lookup before every insert.
+    Use as a context manager so the final partial batch is committed.
+    With metrics (a core.scan_metrics.ScanMetrics), every transaction's latency is recorded.
+    The first transaction that changes file_paths marks the duplicate summary stale.
+    """
 
-    # Step 2: Check if this path for the hash already exists
-    c.execute('SELECT 1 FROM file_paths WHERE hash = ? AND path = ?', (file_hash, file_path))
-    exists = c.fetchone()
+    def __init__(self, db_path, commit_size=DEFAULT_COMMIT_SIZE, hash_algo="md5", metrics=None):
+        self.db_path = db_path
+        self.commit_size = commit_size
+        self.hash_algo = hash_algo
+        self.metrics = metrics
+        self.rows = []
+        self.written = 0
+        self.purged = False
+        self.summary_stale = False
+        # check_same_thread=False: a scan may open the writer on one thread and drive it from another
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
 
-    if not exists:
-        c.execute('INSERT INTO file_paths (hash, path) VALUES (?, ?)', (file_hash, file_path))
+    @contextmanager
+    def _transaction(self, rows, changes_paths=False):
+        """One transaction on the writer's connection, timed when metrics are kept."""
+        start = time.perf_counter()
+        with self.conn:
+            if changes_paths and not self.summary_stale:
+                mark_summary_stale(self.conn)
+                self.summary_stale = True
+            yield
+        if self.metrics:
+            self.metrics.observe_commit(time.perf_counter() - start, rows)
 
-    conn.commit()
+    def add(self, row):
+        """Queues one (hash, path, size, mtime_ns, inode, device) row."""
+        self.rows.append(row)
+        if len(self.rows) >= self.commit_size:
+            self.flush()
+
+    def add_many(self, rows):
+        for row in rows:
+            self.add(row)
+
+    def flush(self):
+        """Writes all queued rows in a single transaction."""
+        if not self.rows:
+            return
+
+        with self._transaction(len(self.rows), changes_paths=True):
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO hashes (hash) VALUES (?)',
+                [(row[0],) for row in self.rows]
+            )
+            self.conn.executemany('''
+                INSERT INTO file_paths (hash, path, size, mtime_ns, inode, device, algo)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (hash, path) DO UPDATE SET
+                    size = excluded.size,
+                    mtime_ns = excluded.mtime_ns,
+                    inode = excluded.inode,
+                    device = excluded.device,
+                    algo = excluded.algo
+            ''', [(*row, self.hash_algo) for row in self.rows])
+
+        self.written += len(self.rows)
+        logger.info(f"✅ Stored batch of {len(self.rows)} entries in DB.")
+        self.rows = []
+
+    def add_fingerprints(self, fingerprints, sample_size, sample_middle):
+        """Stores (entry, fingerprint) pairs along with the sampling settings used."""
+        self.flush()
+        with self._transaction(len(fingerprints)):
+            self.conn.executemany('''
+                INSERT OR REPLACE INTO fingerprints
+                (path, size, mtime_ns, inode, device, fingerprint, sample_size, sample_middle, algo)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(*entry, fingerprint, sample_size, int(sample_middle), self.hash_algo)
+                  for entry, fingerprint in fingerprints])
+
+    def add_hardlinks(self, links):
+        """Stores (link_entry, target_path) pairs."""
+        self.flush()
+        with self._transaction(len(links)):
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO hardlinks (path, target, inode, device) VALUES (?, ?, ?, ?)',
+                [(entry.path, target, entry.inode, entry.device) for entry, target in links]
+            )
+
+    def purge(self, paths):
+        """
+        Deletes stored hashes, fingerprints and hardlinks for paths whose contents may have changed.
+        Hashes left without any path are dropped when the writer closes.
+        """
+        if not paths:
+            return
+        self.flush()
+        rows = [(path,) for path in paths]
+        with self._transaction(len(rows), changes_paths=True):
+            self.conn.executemany("DELETE FROM file_paths WHERE path = ?", rows)
+            self.conn.executemany("DELETE FROM fingerprints WHERE path = ?", rows)
+            self.conn.executemany("DELETE FROM hardlinks WHERE path = ?", rows)
+        self.purged = True
+
+    def rename(self, old_path, new_path):
+        """Moves the stored hash and fingerprint of old_path over to new_path."""
+        self.flush()
+        with self._transaction(1, changes_paths=True):
+            self.conn.execute("UPDATE OR REPLACE file_paths SET path = ? WHERE path = ?", (new_path, old_path))
+            self.conn.execute("UPDATE OR REPLACE fingerprints SET path = ? WHERE path = ?", (new_path, old_path))
+
+    def close(self):
+        try:
+            self.flush()
+            if self.purged:
+                with self._transaction(0):
+                    self.conn.execute("DELETE FROM hashes WHERE hash NOT IN (SELECT hash FROM file_paths)")
+        finally:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def load_hash_cache(db_path):
+    """
+    Returns {path: ((size, mtime_ns, inode, device), hash)} for every stored path.
+    Rows written before stat signatures existed get a signature of None.
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.execute("SELECT path, hash, size, mtime_ns, inode, device FROM file_paths")
+    cache = {}
+    for path, file_hash, size, mtime_ns, inode, device in cursor:
+        signature = (size, mtime_ns, inode, device) if size is not None else None
+        cache[path] = (signature, file_hash)
+    conn.close()
+    return cache
+
+
+def load_fingerprint_cache(db_path, sample_size, sample_middle, algo):
+    """
+    Returns {path: ((size, mtime_ns, inode, device), fingerprint)} for fingerprints
+    taken with the same sampling settings and hash algorithm.
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.execute('''
+        SELECT path, fingerprint, size, mtime_ns, inode, device FROM fingerprints
+        WHERE sample_size = ? AND sample_middle = ? AND algo = ?
+    ''', (sample_size, int(sample_middle), algo))
+    cache = {
+        path: ((size, mtime_ns, inode, device), fingerprint)
+        for path, fingerprint, size, mtime_ns, inode, device in cursor
+    }
     conn.close()
+    return cache
 
+
+def purge_paths(db_path, paths):
+    """Deletes stored rows for paths whose contents may have changed. See BulkWriter.purge."""
+    if not paths:
+        return
+
+    with BulkWriter(db_path) as writer:
+        writer.purge(paths)
+
+
+def stored_hash_algorithms(db_path):
+    """Returns the set of hash algorithms that produced the rows in file_paths."""
+    conn = sqlite3.connect(db_path)
+    algos = {row[0] for row in conn.execute("SELECT DISTINCT algo FROM file_paths")}
+    conn.close()
+    return algos
@@ -2,6 +2,8 @@ import argparse
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+import sys
+import sqlite3
 import logging
 
 from core.duplicate_handler import (
@@ -9,8 +11,15 @@ from core.duplicate_handler import (
     print_database_contents
 )
 from core.discovery import run_discovery_mode
-from core.report_generator import generate_report
-from core.db_exporter import export_to_csv 
+from core.report_generator import write_report, REPORT_SORTS
+from core.db_merge import merge_databases, parse_source
+from core.db_exporter import export_to_file, EXPORT_FORMATS
+from core.scan_metrics import ScanMetrics
+from core.profiling import profiled, DEFAULT_PROFILE_TOP
+from core.file_hasher import DEFAULT_SAMPLE_SIZE, DEFAULT_BUFFER_SIZE, HASH_ALGORITHMS
+from core.file_scanner import load_excluded_dirs
+from db_utils.db_utils import DEFAULT_COMMIT_SIZE
+from core.hash_engine import EXECUTORS, DEFAULT_IPC_BATCH
 
 
 load_dotenv()  # Load variables from .env if available
@@ -26,6 +35,20 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+
+def int_at_least(minimum):
+    """An argparse type accepting integers >= minimum."""
+    def parse(value):
+        try:
+            number = int(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+        if number < minimum:
+            raise argparse.ArgumentTypeError(f"must be at least {minimum}, got {number}")
+        return number
+    return parse
+
+
 def main():
     parser = argparse.ArgumentParser(description="Duplicate File Finder")
     parser.add_argument("directory", help="Directory to scan")
@@ -34,58 +57,175 @@ def main():
     parser.add_argument("--exclude", help="Exclusions config path")
     parser.add_argument("--discover", action="store_true", help="Run discovery mode")
     parser.add_argument("--show-db", action="store_true", help="Print DB contents")
-    parser.add_argument("--export", help="Export DB to CSV at given path")
+    parser.add_argument("--merge", nargs="+", metavar="[NAME=]DB",
+                        help="Merge scan DBs into --db_path; paths are prefixed with NAME: "
+                             "(default: the DB file name, empty NAME for none)")
+    parser.add_argument("--export", help="Export DB to the given path (format from the extension: "
+                                         ".csv, .json, .ndjson, .md; add .gz to compress)")
+    parser.add_argument("--export-format", choices=EXPORT_FORMATS,
+                        help="Export format, overriding the one guessed from the --export path")
+    parser.add_argument("--gzip", action="store_true", help="Gzip the --export output")
     parser.add_argument("--report", action="store_true", help="Generate report of duplicates")
     parser.add_argument("--dry-run", action="store_true", help="Simulate without saving to DB")
     parser.add_argument("--debug", action="store_true", help="Enable debug output")
     parser.add_argument("--log-file", help="Write report output to file instead of stdout")
-    parser.add_argument("--hash-algo", choices=["md5", "sha256"], default="md5",
-                        help="Hashing algorithm to use (default: md5)")
+    parser.add_argument("--top", type=int_at_least(1), help="Report only the N largest duplicate groups")
+    parser.add_argument("--min-copies", type=int_at_least(2), default=2,
+                        help="Report only groups with at least this many copies (default: 2)")
+    parser.add_argument("--sort", choices=REPORT_SORTS, default="wasted",
+                        help="Order report groups by wasted bytes, bytes per copy or copies (default: wasted)")
+    parser.add_argument("--hash-algo", choices=sorted(HASH_ALGORITHMS), default="md5",
+                        help="Hashing algorithm to use (default: md5); xxh3_128 and blake3 "
+                             "are available when their packages are installed")
+    parser.add_argument("--no-size-prune", action="store_true",
+                        help="Hash every file, even those whose size is unique")
+    parser.add_argument("--sample-size", type=int_at_least(0), default=DEFAULT_SAMPLE_SIZE,
+                        help="Bytes sampled from the head/tail of same-size files before "
+                             f"full hashing, 0 disables sampling (default: {DEFAULT_SAMPLE_SIZE})")
+    parser.add_argument("--sample-middle", action="store_true",
+                        help="Also sample a block from the middle of each file")
+    parser.add_argument("--workers", type=int_at_least(1), default=1,
+                        help="Number of threads used to hash files (default: 1)")
+    parser.add_argument("--walkers", type=int_at_least(1), default=1,
+                        help="Number of threads listing directories concurrently; caps the "
+                             "readdir load on network filesystems (default: 1)")
+    parser.add_argument("--executor", choices=EXECUTORS, default="thread",
+                        help="Run --workers as threads or processes; processes suit trees "
+                             "of many small files (default: thread)")
+    parser.add_argument("--ipc-batch", type=int_at_least(1), default=DEFAULT_IPC_BATCH,
+                        help=f"Files sent to a worker process per task (default: {DEFAULT_IPC_BATCH})")
+    parser.add_argument("--buffer-size", type=int_at_least(1), default=DEFAULT_BUFFER_SIZE,
+                        help="Read buffer in bytes for full hashes; smaller files are read in one "
+                             f"call (default: {DEFAULT_BUFFER_SIZE})")
+    parser.add_argument("--mmap", action="store_true",
+                        help="Hash large files from a memory map instead of buffered reads")
+    parser.add_argument("--include-hardlinks", action="store_true",
+                        help="Report hardlinked paths as duplicates (they are still hashed once per inode)")
+    parser.add_argument("--commit-size", type=int_at_least(1), default=DEFAULT_COMMIT_SIZE,
+                        help=f"Rows written per DB transaction (default: {DEFAULT_COMMIT_SIZE})")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Overlap walking, hashing and DB writes in concurrent stages")
+    parser.add_argument("--full-rescan", action="store_true",
+                        help="Rehash every file even if its stored stat signature is unchanged")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the last interrupted scan of this directory from its checkpoint")
+    parser.add_argument("--stats-json", metavar="PATH",
+                        help="Write per-stage timings, throughput, DB commit latencies and peak RSS as JSON")
+    parser.add_argument("--prometheus-textfile", metavar="PATH",
+                        help="Write the same scan metrics for node_exporter's textfile collector (*.prom)")
+    parser.add_argument("--profile", nargs="?", const="profile", metavar="PREFIX",
+                        help="Run the operation under cProfile and tracemalloc and write PREFIX.prof and "
+                             "PREFIX.txt (hot functions and memory top-N; default prefix: profile)")
+    parser.add_argument("--profile-top", type=int_at_least(1), default=DEFAULT_PROFILE_TOP,
+                        help=f"Rows in each --profile report section (default: {DEFAULT_PROFILE_TOP})")
 
     args = parser.parse_args()
 
     # Allow default DB path from .env if not passed
     db_path = args.db_path or os.getenv("DEFAULT_DB_PATH")
 
+    if args.profile:
+        with profiled(args.profile, args.profile_top, _operation_name(args)):
+            run(args, db_path)
+    else:
+        run(args, db_path)
+
+
+def _operation_name(args):
+    for flag in ("discover", "show_db", "merge", "export", "report"):
+        if getattr(args, flag):
+            return flag.replace("_", "-")
+    return "scan"
+
+
+def run(args, db_path):
+    """Runs the operation selected on the command line."""
     if args.discover:
         log_path = args.log_file or "discovered_filetypes.log"
-        run_discovery_mode(args.directory, log_path)
+        excluded_dirs = load_excluded_dirs(args.exclude) if args.exclude else None
+        run_discovery_mode(args.directory, log_path, excluded_dirs, args.walkers)
         return
 
     if args.show_db:
         print_database_contents(db_path)
         return
 
+    if args.merge:
+        if not db_path:
+            logger.error("❌ --merge needs --db_path (or DEFAULT_DB_PATH) for the merged database")
+            sys.exit(1)
+        try:
+            merge_databases(db_path, [parse_source(spec) for spec in args.merge])
+        except (ValueError, sqlite3.Error) as e:
+            logger.error(f"❌ Merge failed: {e}")
+            sys.exit(1)
+        return
+
     if args.export:
-        export_to_csv(db_path, args.export)
+        export_to_file(db_path, args.export, args.export_format, args.gzip or None)
         return
 
     if args.report:
-        report = generate_report(db_path)
         if args.log_file:
             with open(args.log_file, "w") as f:
-                f.write(report)
+                write_report(db_path, f, args.top, args.min_copies, args.sort)
         else:
-            print(report)
+            write_report(db_path, sys.stdout, args.top, args.min_copies, args.sort)
         return
 
     # Log hashing algorithm being used
     logger.info(f"Using hash algorithm: {args.hash_algo.upper()}")
 
+    metrics = ScanMetrics() if args.stats_json or args.prometheus_textfile else None
+
     # Actual duplicate detection
-    results = find_duplicates(
-        args.directory,
-        db_path=None if args.dry_run else db_path,
-        filetypes_path=args.filetypes,
-        debug=args.debug,
-        hash_algo=args.hash_algo
-    )
+    try:
+        results = find_duplicates(
+            args.directory,
+            db_path=None if args.dry_run else db_path,
+            filetypes_path=args.filetypes,
+            debug=args.debug,
+            batch_size=args.commit_size,
+            hash_algo=args.hash_algo,
+            size_prune=not args.no_size_prune,
+            sample_size=args.sample_size,
+            sample_middle=args.sample_middle,
+            workers=args.workers,
+            executor=args.executor,
+            ipc_batch=args.ipc_batch,
+            full_rescan=args.full_rescan,
+            excluded_path=args.exclude,
+            walkers=args.walkers,
+            buffer_size=args.buffer_size,
+            use_mmap=args.mmap,
+            include_hardlinks=args.include_hardlinks,
+            pipeline=args.pipeline,
+            resume=args.resume,
+            metrics=metrics
+        )
+    except ValueError as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
 
     logger.info("✅ Scan complete.")
     logger.info(f"  Total scanned: {results['scanned']}")
     logger.info(f"  Skipped (filtered): {results['skipped']}")
+    logger.info(f"  Hardlinks: {results['hardlinks']}")
+    logger.info(f"  Skipped (unique size): {results['unique_size']}")
+    logger.info(f"  Skipped (unique fingerprint): {results['unique_fingerprint']}")
+    logger.info(f"  Reused from cache: {results['cached']}")
     logger.info(f"  Files hashed/stored: {results['hashed']}")
 
+    try:
+        if args.stats_json:
+            metrics.write_json(args.stats_json)
+            logger.info(f"Scan stats written to {args.stats_json}")
+        if args.prometheus_textfile:
+            metrics.write_prometheus(args.prometheus_textfile)
+            logger.info(f"Prometheus metrics written to {args.prometheus_textfile}")
+    except OSError as e:
+        logger.error(f"❌ Could not write scan stats: {e}")
+
     if args.dry_run:
         logger.info("Dry run complete. No changes saved.")
 
@@ -150,3 +150,17 @@ def test_sha256_hashing(tmp_path):
 
 
 
+
+
+def test_report_limits_must_be_in_range():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for flag, value in (("--top", "0"), ("--top", "-1"), ("--min-copies", "1"), ("--top", "x"),
+                            ("--buffer-size", "0"), ("--ipc-batch", "0"), ("--workers", "0"),
+                            ("--walkers", "0"), ("--commit-size", "0"), ("--profile-top", "0"),
+                            ("--sample-size", "-1")):
+            result = subprocess.run(
+                ["python", "src/main.py", tmpdir, "--report", flag, value],
+                capture_output=True, text=True
+            )
+            assert result.returncode == 2
+            assert f"argument {flag}" in result.stderr
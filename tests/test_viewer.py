@@ -48,3 +48,205 @@ def test_clear_filter_button_present():
     button = soup.select_one("button#clearFilterBtn")
     assert button is not None
     assert "Clear" in button.text
+
+
+def _write_groups(db_path):
+    from db_utils.db_utils import create_db, BulkWriter
+
+    create_db(str(db_path))
+    with BulkWriter(str(db_path)) as writer:
+        writer.add_many([
+            ("big", "/data/a.iso", 1000, 0, 1, 1),
+            ("big", "/data/b.iso", 1000, 0, 2, 1),
+            ("many", "/data/1.txt", 10, 0, 3, 1),
+            ("many", "/data/2.txt", 10, 0, 4, 1),
+            ("many", "/other/3.txt", 10, 0, 5, 1),
+            ("single", "/data/only.txt", 5, 0, 6, 1),
+        ])
+
+
+def test_api_duplicates_pages_with_keyset_cursor(tmp_path, monkeypatch):
+    import viewer.main
+
+    db_path = tmp_path / "api.db"
+    _write_groups(db_path)
+    monkeypatch.setattr(viewer.main, "CURRENT_DB_PATH", db_path)
+
+    seen, after = [], None
+    while True:
+        params = {"limit": 1, "sort": "wasted"}
+        if after:
+            params["after"] = after
+        page = client.get("/api/duplicates", params=params).json()
+        seen += [group["hash"] for group in page["groups"]]
+        after = page["next"]
+        if not after:
+            break
+    assert seen == ["big", "many"]  # 1000 wasted bytes, then 20; unique hashes never listed
+
+    page = client.get("/api/duplicates", params={"prefix": "/data/", "ext": "txt"}).json()
+    assert [(g["hash"], g["paths"]) for g in page["groups"]] == [("many", ["/data/1.txt", "/data/2.txt"])]
+
+    assert client.get("/api/duplicates", params={"sort": "bogus"}).status_code == 400
+    for bad in ("garbage", "12", "x:big", "5:"):
+        assert client.get("/api/duplicates", params={"after": bad}).status_code == 400
+
+
+def test_missing_database_is_read_as_empty_and_never_created(tmp_path, monkeypatch):
+    import viewer.main
+
+    db_path = tmp_path / "missing.db"
+    monkeypatch.setattr(viewer.main, "CURRENT_DB_PATH", db_path)
+
+    assert client.get("/api/duplicates").json() == {"groups": [], "next": None}
+    response = client.get("/export/csv")
+    assert response.status_code == 200
+    assert response.text.strip() == "hash,paths"
+    assert client.get("/export/json").json() == {}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_precomputed_groups_match_live_aggregation(tmp_path):
+    from db_utils.db_utils import rebuild_duplicate_summary
+    from viewer.utils import query_duplicate_groups, load_summary, parse_cursor
+
+    def pages(sort):
+        first, cursor = query_duplicate_groups(db_path, limit=1, sort=sort)
+        return first, query_duplicate_groups(db_path, limit=1, sort=sort, after=parse_cursor(cursor))
+
+    db_path = tmp_path / "summary.db"
+    _write_groups(db_path)  # written after the migration, so the summary is stale
+    live = {sort: pages(sort) for sort in ("count", "wasted")}
+    live_summary = load_summary(db_path)
+
+    rebuild_duplicate_summary(str(db_path))
+    assert {sort: pages(sort) for sort in ("count", "wasted")} == live
+    assert load_summary(db_path) == live_summary == {
+        "hashes": 3, "files": 6, "avg": 2.0, "groups": 2, "wasted": 1020
+    }
+
+
+def test_result_cache_hits_until_db_changes(tmp_path, monkeypatch):
+    import viewer.main
+    from viewer.cache import cache
+    from db_utils.db_utils import BulkWriter
+
+    db_path = tmp_path / "cached.db"
+    _write_groups(db_path)
+    monkeypatch.setattr(viewer.main, "CURRENT_DB_PATH", db_path)
+    cache.clear()
+
+    before = cache.stats()
+    first = client.get("/api/duplicates").json()
+    assert client.get("/api/duplicates").json() == first
+    stats = client.get("/api/cache-stats").json()
+    assert (stats["misses"] - before["misses"], stats["hits"] - before["hits"]) == (1, 1)
+
+    # Any write changes the DB's mtime/size, so the next request recomputes
+    with BulkWriter(str(db_path)) as writer:
+        writer.add(("single", "/data/copy.txt", 5, 0, 7, 1))
+    assert len(client.get("/api/duplicates").json()["groups"]) == 3
+    assert cache.stats()["misses"] - before["misses"] == 2
+
+
+def test_timing_middleware_is_opt_in(tmp_path, monkeypatch):
+    import viewer.main
+    from viewer.timing import timings
+
+    db_path = tmp_path / "timed.db"
+    _write_groups(db_path)
+    monkeypatch.setattr(viewer.main, "CURRENT_DB_PATH", db_path)
+    timings.clear()
+
+    monkeypatch.setattr(timings, "enabled", False)
+    assert "server-timing" not in client.get("/api/duplicates").headers
+    assert client.get("/api/timings").json()["routes"] == []
+
+    monkeypatch.setattr(timings, "enabled", True)
+    response = client.get("/api/duplicates")
+    assert response.headers["server-timing"].startswith("app;dur=")
+    client.get("/api/duplicates")
+    routes = {row["route"]: row for row in client.get("/api/timings").json()["routes"]}
+    assert routes["GET /api/duplicates"]["count"] == 2
+    assert routes["GET /api/duplicates"]["max_ms"] >= routes["GET /api/duplicates"]["p50_ms"]
+
+
+def test_upload_streams_checks_and_caps_databases(tmp_path, monkeypatch):
+    import viewer.main
+
+    monkeypatch.setattr(viewer.main, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(viewer.main, "CURRENT_DB_PATH", viewer.main.CURRENT_DB_PATH)
+    monkeypatch.setattr(viewer.main, "LAST_UPLOAD_FILENAME", None)
+    source = tmp_path / "source.db"
+    _write_groups(source)
+
+    def upload(name, data):
+        response = client.post("/upload", files={"db_file": (name, data)}, follow_redirects=False)
+        return response.headers["location"]
+
+    assert upload("../escape.db", source.read_bytes()) == "/?msg=upload"
+    assert viewer.main.CURRENT_DB_PATH == tmp_path / "escape.db"
+    assert len(client.get("/api/duplicates").json()["groups"]) == 2
+
+    assert upload("junk.db", b"not a database" * 100) == "/?msg=invalid"
+    monkeypatch.setattr(viewer.main, "MAX_UPLOAD_BYTES", 1024)
+    assert upload("big.db", source.read_bytes()) == "/?msg=too_large"
+    assert sorted(p.name for p in tmp_path.glob("*.db*") if not p.name.endswith(("-wal", "-shm"))) == ["escape.db", "source.db"]
+
+    # An oversized Content-Length is refused before the body reaches the form parser
+    monkeypatch.setattr(viewer.main, "UPLOAD_FORM_OVERHEAD", 0)
+    monkeypatch.setattr(viewer.main, "_save_upload", None)
+    assert upload("big.db", source.read_bytes()) == "/?msg=too_large"
+    response = client.post("/upload", content=iter([b"chunked"]), follow_redirects=False)
+    assert response.status_code == 411
+
+
+def test_open_db_views_server_side_file_in_place(tmp_path, monkeypatch):
+    import sqlite3
+    import viewer.main
+
+    monkeypatch.setattr(viewer.main, "CURRENT_DB_PATH", viewer.main.CURRENT_DB_PATH)
+    monkeypatch.setattr(viewer.main, "LAST_UPLOAD_FILENAME", None)
+    db_path = tmp_path / "index.db"
+    _write_groups(db_path)
+    # Looks like an older index: opening it in place must still not migrate it
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+
+    def open_db(path):
+        return client.post("/open-db", data={"db_path": str(path)}, follow_redirects=False).headers["location"]
+
+    # Without VIEWER_DB_ROOTS nothing can be opened in place
+    monkeypatch.setattr(viewer.main, "DB_ROOTS", [])
+    assert open_db(db_path) == "/?msg=forbidden"
+
+    monkeypatch.setattr(viewer.main, "DB_ROOTS", [tmp_path.resolve()])
+    assert open_db(db_path) == "/?msg=opened"
+    assert viewer.main.CURRENT_DB_PATH == db_path.resolve()
+    assert client.get("/api/duplicates").status_code == 200
+    assert sqlite3.connect(db_path).execute("PRAGMA user_version").fetchone()[0] == 1
+
+    other = tmp_path / "other.db"
+    conn = sqlite3.connect(other)
+    conn.execute("CREATE TABLE notes (body TEXT)")
+    conn.commit()
+    conn.close()
+    assert open_db(other) == "/?msg=invalid"
+
+    monkeypatch.setattr(viewer.main, "DB_ROOTS", [tmp_path / "allowed"])
+    assert open_db(db_path) == "/?msg=forbidden"
+
+
+def test_file_action_reports_successes_and_failures(tmp_path, monkeypatch):
+    import viewer.main
+
+    monkeypatch.setattr(viewer.main, "EXPORT_DIR", tmp_path)
+    victim = tmp_path / "victim.txt"
+    victim.write_text("bye")
+
+    response = client.post("/file-action", data={"action": "delete", "paths": [str(victim), str(tmp_path / "gone.txt")]},
+                           follow_redirects=False)
+    assert response.headers["location"] == "/?msg=delete&done=1&failed=1"
+    assert not victim.exists()
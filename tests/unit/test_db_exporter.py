@@ -0,0 +1,62 @@
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+
+import pytest
+
+# Add src/ to import path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from core.db_exporter import iter_export, gzip_stream, export_to_file, format_for_path
+from db_utils.db_utils import create_db, BulkWriter
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "export.db")
+    create_db(path)
+    with BulkWriter(path) as writer:
+        writer.add_many([
+            ("bbb", "/z/copy.txt", 3, 0, 1, 1),
+            ("bbb", "/a/orig.txt", 3, 0, 2, 1),
+            ("aaa", "/only.txt", 5, 0, 3, 1),
+        ])
+    return path
+
+
+def test_formats_group_paths_by_hash(db_path):
+    rows = list(csv.reader(io.StringIO("".join(iter_export(db_path, "csv")))))
+    assert rows == [["hash", "paths"], ["aaa", "/only.txt"], ["bbb", "/a/orig.txt;/z/copy.txt"]]
+
+    assert json.loads("".join(iter_export(db_path, "json"))) == {
+        "aaa": ["/only.txt"],
+        "bbb": ["/a/orig.txt", "/z/copy.txt"],
+    }
+
+    lines = "".join(iter_export(db_path, "ndjson")).splitlines()
+    assert [json.loads(line)["hash"] for line in lines] == ["aaa", "bbb"]
+
+    # Markdown summarises duplicates only
+    markdown = "".join(iter_export(db_path, "markdown"))
+    assert "### Hash: `bbb`\n- /a/orig.txt\n- /z/copy.txt\n" in markdown
+    assert "aaa" not in markdown
+
+
+def test_empty_json_export_is_valid(tmp_path):
+    path = str(tmp_path / "empty.db")
+    create_db(path)
+    assert json.loads("".join(iter_export(path, "json"))) == {}
+
+
+def test_gzip_stream_and_file_export(db_path, tmp_path):
+    plain = "".join(iter_export(db_path, "ndjson"))
+    assert gzip.decompress(b"".join(gzip_stream(iter_export(db_path, "ndjson")))).decode() == plain
+
+    out = tmp_path / "dupes.ndjson.gz"
+    assert format_for_path(out) == "ndjson"
+    export_to_file(db_path, out)
+    with gzip.open(out, "rt") as f:
+        assert f.read() == plain
@@ -0,0 +1,110 @@
+import sqlite3
+
+import pytest
+
+from core.db_merge import merge_databases, parse_source
+from db_utils.db_utils import BulkWriter, create_db, read_duplicate_summary
+
+
+def _scan_db(path, rows, algo="md5"):
+    create_db(str(path))
+    with BulkWriter(str(path), hash_algo=algo) as writer:
+        writer.add_many(rows)
+    return str(path)
+
+
+def _paths(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT hash, path FROM file_paths ORDER BY path").fetchall()
+    conn.close()
+    return rows
+
+
+def test_parse_source():
+    assert parse_source("hostA=/dbs/a.db") == ("hostA", "/dbs/a.db")
+    assert parse_source("/dbs/nas-01.db") == ("nas-01", "/dbs/nas-01.db")
+    assert parse_source("=/dbs/a.db") == ("", "/dbs/a.db")
+    assert parse_source("/data/run=2/host.db") == ("host", "/data/run=2/host.db")
+    assert parse_source("nas=/data/run=2/host.db") == ("nas", "/data/run=2/host.db")
+
+
+def test_merge_namespaces_hosts_and_finds_cross_host_duplicates(tmp_path):
+    a = _scan_db(tmp_path / "a.db", [("h1", "/data/x.iso", 100, 0, 1, 1), ("h2", "/data/y.txt", 5, 0, 2, 1)])
+    b = _scan_db(tmp_path / "b.db", [("h1", "/data/x.iso", 100, 0, 1, 1)])
+    target = str(tmp_path / "merged.db")
+
+    assert merge_databases(target, [("hostA", a), ("hostB", b)]) == {a: 2, b: 1}
+    assert _paths(target) == [("h1", "hostA:/data/x.iso"), ("h2", "hostA:/data/y.txt"), ("h1", "hostB:/data/x.iso")]
+
+    conn = sqlite3.connect(target)
+    summary = read_duplicate_summary(conn)
+    conn.close()
+    assert (summary["groups"], summary["wasted_bytes"]) == (1, 100)
+
+    # Merging a host again replaces its earlier rows
+    b2 = _scan_db(tmp_path / "b2.db", [("h3", "/data/z.bin", 7, 0, 3, 1)])
+    merge_databases(target, [("hostB", b2)])
+    assert _paths(target) == [("h1", "hostA:/data/x.iso"), ("h2", "hostA:/data/y.txt"), ("h3", "hostB:/data/z.bin")]
+
+
+def test_merge_refuses_mixed_hash_algorithms(tmp_path):
+    a = _scan_db(tmp_path / "a.db", [("d41d8cd98f00b204e9800998ecf8427e", "/a", 0, 0, 1, 1)])
+    b = _scan_db(tmp_path / "b.db", [("e3b0c442" * 8, "/b", 0, 0, 1, 1)], algo="sha256")
+    target = str(tmp_path / "merged.db")
+
+    with pytest.raises(ValueError, match="sha256"):
+        merge_databases(target, [("a", a), ("b", b)])
+    assert _paths(target) == []  # nothing written
+
+
+def test_merge_refuses_sources_sharing_a_namespace(tmp_path):
+    (tmp_path / "hostA").mkdir()
+    (tmp_path / "hostB").mkdir()
+    a = _scan_db(tmp_path / "hostA" / "hashes.db", [("h1", "/data/x.iso", 100, 0, 1, 1)])
+    b = _scan_db(tmp_path / "hostB" / "hashes.db", [("h1", "/data/x.iso", 100, 0, 1, 1)])
+    target = str(tmp_path / "merged.db")
+
+    with pytest.raises(ValueError, match="hashes"):
+        merge_databases(target, [parse_source(a), parse_source(b)])
+    assert not (tmp_path / "merged.db").exists()
+
+
+def test_merge_reads_old_read_only_sources_as_they_are(tmp_path):
+    import os
+    import stat
+
+    old = tmp_path / "old.db"
+    conn = sqlite3.connect(old)
+    conn.execute("CREATE TABLE hashes (hash TEXT PRIMARY KEY)")
+    conn.execute("CREATE TABLE file_paths (id INTEGER PRIMARY KEY AUTOINCREMENT, hash TEXT, path TEXT)")
+    conn.execute("INSERT INTO hashes VALUES (?)", ("a" * 32,))
+    conn.executemany("INSERT INTO file_paths (hash, path) VALUES (?, ?)", [("a" * 32, "/x"), ("a" * 32, "/y")])
+    conn.commit()
+    conn.close()
+    before = old.read_bytes()
+    os.chmod(old, stat.S_IRUSR)
+    target = str(tmp_path / "merged.db")
+
+    try:
+        assert merge_databases(target, [("old", str(old))]) == {str(old): 2}
+    finally:
+        os.chmod(old, stat.S_IRUSR | stat.S_IWUSR)
+    assert old.read_bytes() == before
+
+    conn = sqlite3.connect(target)
+    rows = conn.execute("SELECT path, size, algo FROM file_paths ORDER BY path").fetchall()
+    conn.close()
+    assert rows == [("old:/x", None, "md5"), ("old:/y", None, "md5")]
+
+
+def test_remerging_a_namespace_drops_hashes_left_without_paths(tmp_path):
+    a = _scan_db(tmp_path / "a.db", [("h1", "/data/x.iso", 100, 0, 1, 1), ("h2", "/data/y.txt", 5, 0, 2, 1)])
+    a2 = _scan_db(tmp_path / "a2.db", [("h1", "/data/x.iso", 100, 0, 1, 1)])
+    target = str(tmp_path / "merged.db")
+
+    merge_databases(target, [("hostA", a)])
+    merge_databases(target, [("hostA", a2)])
+    conn = sqlite3.connect(target)
+    hashes = [row[0] for row in conn.execute("SELECT hash FROM hashes ORDER BY hash")]
+    conn.close()
+    assert hashes == ["h1"]
@@ -66,3 +66,111 @@ def test_duplicate_path_not_inserted_twice():
         conn.close()
     finally:
         os.remove(db_path)
+
+
+def test_bulk_writer_upserts_on_unique_hash_path(tmp_path):
+    from db_utils.db_utils import BulkWriter
+
+    db_path = str(tmp_path / "bulk.db")
+    create_db(db_path)
+
+    with BulkWriter(db_path, commit_size=2) as writer:
+        writer.add(("h1", "/a", 1, 10, 100, 1))
+        writer.add(("h1", "/b", 1, 10, 101, 1))
+        writer.add(("h1", "/a", 1, 20, 100, 1))  # same (hash, path): refresh, don't duplicate
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT path, mtime_ns FROM file_paths ORDER BY path").fetchall()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    conn.close()
+    assert rows == [("/a", 20), ("/b", 10)]
+
+
+def test_create_db_dedupes_legacy_rows_for_unique_index(tmp_path):
+    db_path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE hashes (hash TEXT PRIMARY KEY)")
+    conn.execute("CREATE TABLE file_paths (id INTEGER PRIMARY KEY AUTOINCREMENT, hash TEXT, path TEXT)")
+    conn.executemany("INSERT INTO file_paths (hash, path) VALUES (?, ?)", [("h", "/x"), ("h", "/x")])
+    conn.commit()
+    conn.close()
+
+    create_db(db_path)
+    store_hash_in_db(db_path, "h", "/x")
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM file_paths").fetchone()[0] == 1
+    conn.close()
+
+
+def test_migrate_db_upgrades_unversioned_database(tmp_path):
+    from db_utils.db_utils import migrate_db, schema_version, SCHEMA_VERSION
+
+    # Same layout as tools/create_alt_db.py: no id column, no indexes
+    db_path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE hashes (hash TEXT PRIMARY KEY)")
+    conn.execute("CREATE TABLE file_paths (hash TEXT, path TEXT)")
+    conn.execute("INSERT INTO file_paths VALUES ('d41d8cd98f00b204e9800998ecf8427e', '/old/file')")
+    conn.commit()
+    conn.close()
+
+    assert migrate_db(db_path) == 0
+    assert schema_version(db_path) == SCHEMA_VERSION
+    assert migrate_db(db_path) == SCHEMA_VERSION  # already current: nothing to do
+
+    conn = sqlite3.connect(db_path)
+    plan = " ".join(row[3] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT path FROM file_paths WHERE hash = ?", ("x",)))
+    assert "USING" in plan and "INDEX" in plan
+    plan = " ".join(row[3] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT hash FROM file_paths WHERE path = ?", ("x",)))
+    assert "idx_file_paths_path" in plan
+    assert conn.execute("SELECT algo FROM file_paths").fetchone()[0] == "md5"
+    conn.close()
+
+
+def test_duplicate_summary_rebuilt_and_marked_stale(tmp_path):
+    from db_utils.db_utils import BulkWriter, rebuild_duplicate_summary, read_duplicate_summary
+
+    db_path = str(tmp_path / "summary.db")
+    create_db(db_path)
+    with BulkWriter(db_path) as writer:
+        writer.add_many([
+            ("big", "/a/big1", 1000, 0, 1, 1),
+            ("big", "/a/big2", 1000, 0, 2, 1),
+            ("big", "/a/big3", 1000, 0, 3, 1),
+            ("small", "/a/small1", 10, 0, 4, 1),
+            ("small", "/a/small2", 10, 0, 5, 1),
+            ("single", "/a/single", 50, 0, 6, 1),
+        ])
+
+    conn = sqlite3.connect(db_path)
+    assert read_duplicate_summary(conn) is None  # written after the migration built it
+    conn.close()
+
+    summary = rebuild_duplicate_summary(db_path)
+    assert summary == {"hashes": 3, "files": 6, "groups": 2, "duplicate_files": 5,
+                       "wasted_bytes": 2010, "max_copies": 3}
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT hash, copies, size, wasted FROM duplicate_groups ORDER BY wasted DESC").fetchall() == [
+        ("big", 3, 1000, 2000), ("small", 2, 10, 10)
+    ]
+    conn.close()
+
+    with BulkWriter(db_path) as writer:
+        writer.purge(["/a/small2"])
+    conn = sqlite3.connect(db_path)
+    assert read_duplicate_summary(conn) is None
+    conn.close()
+
+
+def test_store_hash_in_db_records_the_algorithm(tmp_path):
+    from db_utils.db_utils import stored_hash_algorithms
+
+    db_path = str(tmp_path / "single.db")
+    create_db(db_path)
+    store_hash_in_db(db_path, "e3b0c442" * 8, "/x", hash_algo="sha256")
+
+    assert stored_hash_algorithms(db_path) == {"sha256"}
@@ -0,0 +1,250 @@
+import os
+import sqlite3
+
+import pytest
+
+from core.duplicate_handler import find_duplicates
+
+
+def _duplicate_groups(db_path):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT hash, path FROM file_paths
+        WHERE hash IN (SELECT hash FROM file_paths GROUP BY hash HAVING COUNT(path) > 1)
+        ORDER BY hash, path
+    """)
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+
+def test_size_prune_matches_full_scan(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "a.txt").write_text("same content")
+    (data / "b.txt").write_text("same content")
+    (data / "c.txt").write_text("diff content")  # same size, different bytes
+    (data / "lonely.txt").write_text("a file with a unique size")
+
+    pruned_db = tmp_path / "pruned.db"
+    full_db = tmp_path / "full.db"
+
+    pruned = find_duplicates(str(data), str(pruned_db))
+    full = find_duplicates(str(data), str(full_db), size_prune=False)
+
+    assert pruned["unique_size"] == 1
+    assert pruned["hashed"] == 3
+    assert full["unique_size"] == 0
+    assert full["hashed"] == 4
+    assert _duplicate_groups(pruned_db) == _duplicate_groups(full_db)
+    assert len(_duplicate_groups(pruned_db)) == 2
+
+
+def test_fingerprint_stage_skips_full_reads(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    block = b"a" * 20000
+    (data / "a.bin").write_bytes(block)
+    (data / "b.bin").write_bytes(block)
+    (data / "c.bin").write_bytes(b"b" + block[1:])  # same size, different head
+
+    db_path = tmp_path / "scan.db"
+    result = find_duplicates(str(data), str(db_path), sample_size=1024)
+
+    assert result["fingerprinted"] == 3
+    assert result["unique_fingerprint"] == 1
+    assert result["bytes_saved"] == 20000
+    assert result["hashed"] == 2
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0] == 3
+    conn.close()
+    assert len(_duplicate_groups(db_path)) == 2
+
+
+def test_process_pool_scan_summary(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    for i in range(12):
+        (data / f"f{i}.txt").write_text(f"copy {i % 3}")
+    (data / "skip.log").write_text("copy 0")
+    filetypes = tmp_path / "types.txt"
+    filetypes.write_text(".txt\n")
+
+    serial = find_duplicates(str(data), str(tmp_path / "serial.db"), filetypes_path=str(filetypes))
+    pooled = find_duplicates(str(data), str(tmp_path / "pooled.db"), filetypes_path=str(filetypes),
+                             hash_algo="md5", workers=2, executor="process", ipc_batch=5)
+
+    assert pooled == serial
+    assert pooled["scanned"] == 13
+    assert pooled["skipped"] == 1
+    assert pooled["hashed"] == 12
+    assert _duplicate_groups(tmp_path / "pooled.db") == _duplicate_groups(tmp_path / "serial.db")
+
+
+def test_rescan_reuses_hashes_of_unchanged_files(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "a.txt").write_text("same content")
+    (data / "b.txt").write_text("same content")
+    (data / "c.txt").write_text("same content")
+    db_path = tmp_path / "scan.db"
+
+    first = find_duplicates(str(data), str(db_path))
+    assert first["hashed"] == 3
+
+    second = find_duplicates(str(data), str(db_path))
+    assert second["hashed"] == 0
+    assert second["cached"] == 3
+
+    os.utime(data / "c.txt", ns=(1, 1))  # touch: same bytes, new stat signature
+    third = find_duplicates(str(data), str(db_path))
+    assert third["hashed"] == 1
+    assert third["cached"] == 2
+
+    forced = find_duplicates(str(data), str(db_path), full_rescan=True)
+    assert forced["hashed"] == 3
+    assert forced["cached"] == 0
+    assert len(_duplicate_groups(db_path)) == 3
+
+
+def test_rescan_drops_rows_of_changed_files(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "a.txt").write_text("same content")
+    (data / "b.txt").write_text("same content")
+    db_path = tmp_path / "scan.db"
+    find_duplicates(str(data), str(db_path))
+
+    (data / "b.txt").write_text("now different content")
+    find_duplicates(str(data), str(db_path))
+
+    assert _duplicate_groups(db_path) == []
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_full_rescan_replaces_hash_of_file_changed_in_place(tmp_path, pipeline):
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "x").write_text("same content")
+    (data / "y").write_text("same content")
+    db_path = tmp_path / "scan.db"
+    find_duplicates(str(data), str(db_path), pipeline=pipeline)
+
+    # Same size and mtime: only a full rescan can notice the new bytes
+    stat = os.stat(data / "x")
+    (data / "x").write_text("SAME CONTENT")
+    os.utime(data / "x", ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    find_duplicates(str(data), str(db_path), pipeline=pipeline, full_rescan=True)
+
+    assert _duplicate_groups(db_path) == []
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM file_paths WHERE path LIKE '%x'").fetchone()[0] == 1
+    conn.close()
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_rescan_removes_rows_of_deleted_files(tmp_path, pipeline):
+    from core.report_generator import generate_report
+
+    data = tmp_path / "data"
+    data.mkdir()
+    for name in ("a.bin", "b.bin"):
+        (data / name).write_bytes(b"x" * 3000)
+    for name in ("notes.txt", "copy.txt"):
+        (data / name).write_text("text")
+    db_path = tmp_path / "scan.db"
+    find_duplicates(str(data), str(db_path), pipeline=pipeline)
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO file_paths (hash, path, algo) VALUES ('h', ?, 'md5')", (str(tmp_path / "elsewhere.bin"),))
+    conn.commit()
+    conn.close()
+
+    (data / "b.bin").unlink()
+    (data / "notes.txt").unlink()
+    filetypes = tmp_path / "filetypes.txt"
+    filetypes.write_text(".bin\n")
+    results = find_duplicates(str(data), str(db_path), filetypes_path=str(filetypes), pipeline=pipeline)
+
+    assert results["removed"] == 1
+    assert results["wasted_bytes"] == 4  # only the .txt pair, which this scan did not look at
+    assert str(data / "b.bin") not in generate_report(str(db_path))
+    conn = sqlite3.connect(db_path)
+    paths = {row[0] for row in conn.execute("SELECT path FROM file_paths")}
+    conn.close()
+    # Outside the scanned root, or filtered out by extension: left alone
+    assert str(tmp_path / "elsewhere.bin") in paths
+    assert str(data / "notes.txt") in paths
+
+
+def test_refuses_to_mix_hash_algorithms(tmp_path):
+    import pytest
+
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "a.txt").write_text("same content")
+    (data / "b.txt").write_text("same content")
+    db_path = tmp_path / "scan.db"
+
+    find_duplicates(str(data), str(db_path), hash_algo="blake2b")
+    conn = sqlite3.connect(db_path)
+    assert {row[0] for row in conn.execute("SELECT algo FROM file_paths")} == {"blake2b"}
+    conn.close()
+
+    with pytest.raises(ValueError):
+        find_duplicates(str(data), str(db_path), hash_algo="md5")
+
+
+def test_hardlinks_hashed_once_and_kept_out_of_groups(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    (data / "a.txt").write_text("hardlinked content")
+    os.link(data / "a.txt", data / "b.txt")
+    os.link(data / "a.txt", data / "c.txt")
+    (data / "copy1.txt").write_text("real duplicate")
+    (data / "copy2.txt").write_text("real duplicate")
+    db_path = tmp_path / "scan.db"
+
+    result = find_duplicates(str(data), str(db_path), sample_size=0)
+
+    assert result["hardlinks"] == 2
+    assert result["hashed"] == 2
+    groups = _duplicate_groups(db_path)
+    assert {path for _, path in groups} == {str(data / "copy1.txt"), str(data / "copy2.txt")}
+
+    conn = sqlite3.connect(db_path)
+    links = conn.execute("SELECT path, target FROM hardlinks ORDER BY path").fetchall()
+    conn.close()
+    assert links == [(str(data / "b.txt"), str(data / "a.txt")), (str(data / "c.txt"), str(data / "a.txt"))]
+
+    included_db = tmp_path / "included.db"
+    included = find_duplicates(str(data), str(included_db), sample_size=0, include_hardlinks=True)
+    assert included["hashed"] == 3  # a.txt once, plus the two real copies
+    assert len(_duplicate_groups(included_db)) == 5
+
+
+def test_scan_maintains_duplicate_summary_for_reports(tmp_path, capsys):
+    from core.duplicate_handler import generate_report as print_report
+    from core.report_generator import generate_report
+
+    data = tmp_path / "data"
+    data.mkdir()
+    for name in ("a.bin", "b.bin", "c.bin"):
+        (data / name).write_bytes(b"x" * 300)
+    (data / "d.txt").write_text("dup")
+    (data / "e.txt").write_text("dup")
+    db_path = str(tmp_path / "scan.db")
+
+    results = find_duplicates(str(data), db_path)
+    assert results["wasted_bytes"] == 2 * 300 + 3
+
+    report = generate_report(db_path)
+    assert "Wasted bytes:     603" in report
+    # Largest waste first
+    assert report.index("3 copies × 300 bytes, 600 bytes wasted") < report.index("2 copies × 3 bytes, 3 bytes wasted")
+
+    print_report(db_path)
+    out = capsys.readouterr().out
+    assert "Duplicate groups:    2" in out
+    assert "Wasted bytes:        603" in out
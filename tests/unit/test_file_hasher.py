@@ -15,3 +15,59 @@ def test_compute_hash_on_known_content():
         assert result == expected_hash, f"Expected {expected_hash}, got {result}"
     finally:
         os.remove(tmp_file_path)
+
+
+def test_fingerprint_samples_head_and_tail(tmp_path):
+    from core.file_hasher import compute_fingerprint
+
+    base = b"x" * 10000
+    file1 = tmp_path / "one.bin"
+    file2 = tmp_path / "two.bin"
+    file3 = tmp_path / "three.bin"
+    file1.write_bytes(base)
+    file2.write_bytes(base[:5000] + b"y" + base[5001:])  # differs only in the middle
+    file3.write_bytes(b"z" + base[1:])                    # differs in the head
+
+    fp1 = compute_fingerprint(str(file1), sample_size=1024)
+    assert fp1 == compute_fingerprint(str(file2), sample_size=1024)
+    assert fp1 != compute_fingerprint(str(file3), sample_size=1024)
+    assert compute_fingerprint(str(file1), sample_size=1024, include_middle=True) != \
+        compute_fingerprint(str(file2), sample_size=1024, include_middle=True)
+
+    # Too small to sample: the full hash is just as cheap
+    assert compute_fingerprint(str(file1), sample_size=8192) is None
+
+
+def test_compute_hash_paths_agree(tmp_path):
+    import hashlib
+    from core.file_hasher import compute_hash
+
+    content = os.urandom(300_000)
+    path = tmp_path / "big.bin"
+    path.write_bytes(content)
+    expected = hashlib.sha256(content).hexdigest()
+
+    assert compute_hash(str(path), "sha256") == expected                       # single read
+    assert compute_hash(str(path), "sha256", buffer_size=4096) == expected     # readinto loop
+    assert compute_hash(str(path), "sha256", buffer_size=7000, use_mmap=True) == expected
+
+    import pytest
+    with pytest.raises(ValueError, match="buffer_size"):
+        compute_hash(str(path), "sha256", buffer_size=0)
+
+
+def test_registered_algorithms(tmp_path):
+    import hashlib
+    from core.file_hasher import compute_hash, register_hash_algorithm, HASH_ALGORITHMS
+
+    path = tmp_path / "file.txt"
+    path.write_bytes(b"registry")
+
+    assert compute_hash(str(path), "blake2b") == hashlib.blake2b(b"registry").hexdigest()
+    assert compute_hash(str(path), "nope") is None
+
+    register_hash_algorithm("sha1", hashlib.sha1)
+    try:
+        assert compute_hash(str(path), "sha1") == hashlib.sha1(b"registry").hexdigest()
+    finally:
+        del HASH_ALGORITHMS["sha1"]
@@ -35,3 +35,69 @@ def test_walk_files_yields_all_files(tmp_path):
     assert str(file1) in found
     assert str(file2) in found
 
+
+
+def test_walk_files_prunes_excluded_dirs(tmp_path, monkeypatch):
+    (tmp_path / "keep").mkdir()
+    (tmp_path / "node_modules" / "pkg").mkdir(parents=True)
+    kept = tmp_path / "keep" / "file.txt"
+    kept.write_text("keep me")
+    (tmp_path / "node_modules" / "pkg" / "index.js").write_text("skip me")
+
+    listed = []
+    real_scandir = os.scandir
+
+    def tracking_scandir(path):
+        listed.append(os.path.basename(path))
+        return real_scandir(path)
+
+    monkeypatch.setattr(os, "scandir", tracking_scandir)
+    found = set(walk_files(tmp_path, excluded_dirs={"node_modules"}))
+
+    assert found == {str(kept)}
+    assert "node_modules" not in listed
+    assert "pkg" not in listed
+
+
+def test_walk_entries_hands_off_stat(tmp_path):
+    from core.file_scanner import walk_entries, stat_entry
+
+    file1 = tmp_path / "file1.bin"
+    file1.write_bytes(b"12345")
+
+    (entry,) = list(walk_entries(tmp_path))
+    file_entry = stat_entry(entry)
+
+    assert file_entry.path == str(file1)
+    assert file_entry.size == 5
+    assert file_entry.inode == file1.stat().st_ino
+
+
+def test_parallel_walk_matches_serial(tmp_path):
+    expected = set()
+    for i in range(6):
+        for j in range(4):
+            sub = tmp_path / f"d{i}" / f"s{j}"
+            sub.mkdir(parents=True)
+            for k in range(3):
+                path = sub / f"f{k}.txt"
+                path.write_text("x")
+                expected.add(str(path))
+    (tmp_path / "d0" / ".git").mkdir()
+    (tmp_path / "d0" / ".git" / "HEAD").write_text("ref")
+
+    found = list(walk_files(tmp_path, excluded_dirs={".git"}, walkers=4))
+
+    assert len(found) == len(expected)
+    assert set(found) == expected
+    assert set(walk_files(tmp_path, excluded_dirs={".git"})) == expected
+
+
+def test_parallel_walk_stops_when_consumer_does(tmp_path):
+    for i in range(50):
+        (tmp_path / f"d{i}").mkdir()
+        (tmp_path / f"d{i}" / "f.txt").write_text("x")
+
+    walker = walk_files(tmp_path, walkers=3)
+    next(walker)
+    walker.close()  # must not hang waiting on blocked walker threads
@@ -0,0 +1,66 @@
+import threading
+import time
+
+from core.file_hasher import compute_hash
+from core.hash_engine import hash_files, ordered_map
+
+
+def test_hash_files_matches_serial_order(tmp_path):
+    paths = []
+    for i in range(20):
+        path = tmp_path / f"file{i}.txt"
+        path.write_text(f"content {i % 5}")
+        paths.append(str(path))
+
+    threaded = list(hash_files(paths, workers=4))
+
+    assert [p for p, _ in threaded] == paths
+    assert [h for _, h in threaded] == [compute_hash(p) for p in paths]
+
+
+def test_ordered_map_bounds_in_flight_work():
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+    pulled = []
+
+    def items():
+        for i in range(50):
+            pulled.append(i)
+            yield i
+
+    def slow(i):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep(0.001 * (i % 3))
+        with lock:
+            state["running"] -= 1
+        return i * 2
+
+    results = ordered_map(slow, items(), workers=3, max_pending=5)
+    first = next(results)
+    assert first == (0, 0)
+    assert len(pulled) <= 6  # never reads far ahead of the consumer
+
+    rest = list(results)
+    assert [r for _, r in rest] == [i * 2 for i in range(1, 50)]
+    assert state["peak"] <= 3
+
+
+def test_process_executor_matches_serial(tmp_path):
+    paths = []
+    for i in range(30):
+        path = tmp_path / f"file{i}.txt"
+        path.write_text(f"content {i % 4}")
+        paths.append(str(path))
+
+    for algo in ("md5", "sha256"):
+        result = list(hash_files(paths, algo, workers=2, executor="process", ipc_batch=4))
+        assert result == [(p, compute_hash(p, algo)) for p in paths]
+
+
+def test_ordered_map_refuses_empty_ipc_batches():
+    import pytest
+
+    with pytest.raises(ValueError, match="ipc_batch"):
+        list(ordered_map(str, ["a", "b"], workers=2, executor="process", ipc_batch=0))
@@ -0,0 +1,30 @@
+from core.profiling import profiled
+
+
+def _busy():
+    return sorted(str(i) for i in range(20000))
+
+
+def test_profiled_writes_hot_functions_and_memory_report(tmp_path):
+    prefix = tmp_path / "scan"
+    with profiled(prefix, top=5, label="scan"):
+        kept = _busy()
+
+    report = (tmp_path / "scan.txt").read_text()
+    assert (tmp_path / "scan.prof").stat().st_size > 0
+    assert report.startswith("Profile of scan:")
+    assert "Hot functions by cumulative time (top 5)" in report
+    assert "_busy" in report
+    assert "traced peak" in report
+    assert "test_profiling.py" in report  # kept is still allocated
+    assert len(kept) == 20000
+
+
+def test_profiled_reports_even_when_interrupted(tmp_path):
+    prefix = tmp_path / "aborted"
+    try:
+        with profiled(prefix):
+            raise KeyboardInterrupt
+    except KeyboardInterrupt:
+        pass
+    assert (tmp_path / "aborted.txt").exists()
@@ -0,0 +1,56 @@
+import io
+import sqlite3
+
+from core.report_generator import generate_report, write_report
+from db_utils.db_utils import BulkWriter, create_db, rebuild_duplicate_summary
+
+
+def _db(tmp_path):
+    db_path = str(tmp_path / "report.db")
+    create_db(db_path)
+    with BulkWriter(db_path) as writer:
+        writer.add_many([
+            ("wide", "/a/one; two.txt", 10, 0, 1, 1),
+            ("wide", "/b/one; two.txt", 10, 0, 2, 1),
+            ("wide", "/c/one; two.txt", 10, 0, 3, 1),
+            ("wide", "/d/one; two.txt", 10, 0, 4, 1),
+            ("big", "/a/disk.iso", 5000, 0, 5, 1),
+            ("big", "/b/disk.iso", 5000, 0, 6, 1),
+            ("single", "/a/only.txt", 1, 0, 7, 1),
+        ])
+    return db_path
+
+
+def _groups(report):
+    return [line.split()[1] for line in report.splitlines() if line.startswith("Hash:")]
+
+
+def test_report_streams_groups_with_intact_paths(tmp_path):
+    db_path = _db(tmp_path)
+    out = io.StringIO()
+    assert write_report(db_path, out)
+    report = out.getvalue()
+
+    assert _groups(report) == ["big", "wide"]  # 5000 wasted bytes before 30
+    assert "  - /a/one; two.txt\n  - /b/one; two.txt\n" in report
+    assert "Wasted bytes:     5030" in report
+
+
+def test_report_top_min_copies_and_sort(tmp_path):
+    db_path = _db(tmp_path)
+    rebuild_duplicate_summary(db_path)
+
+    assert _groups(generate_report(db_path, sort="copies")) == ["wide", "big"]
+    assert _groups(generate_report(db_path, sort="size", top=1)) == ["big"]
+    assert _groups(generate_report(db_path, min_copies=3)) == ["wide"]
+
+
+def test_report_from_stale_summary_matches_precomputed(tmp_path):
+    db_path = _db(tmp_path)
+    stale = generate_report(db_path, sort="copies")
+    rebuild_duplicate_summary(db_path)
+    assert generate_report(db_path, sort="copies") == stale
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT stale FROM duplicate_summary").fetchone() == (0,)
+    conn.close()
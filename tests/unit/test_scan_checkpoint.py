@@ -0,0 +1,123 @@
+import sqlite3
+
+import pytest
+
+import core.scan_checkpoint as scan_checkpoint
+from core.duplicate_handler import find_duplicates
+
+
+@pytest.fixture
+def tree(tmp_path):
+    data = tmp_path / "data"
+    for d in range(6):
+        sub = data / f"dir{d}"
+        sub.mkdir(parents=True)
+        for i in range(3):
+            (sub / f"f{i}.txt").write_text(f"content {i}")
+    return data
+
+
+def _rows(db_path, sql):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(sql).fetchall()
+    conn.close()
+    return rows
+
+
+def test_interrupted_walk_resumes_without_relisting(tmp_path, tree, monkeypatch):
+    db_path = str(tmp_path / "scan.db")
+    monkeypatch.setattr(scan_checkpoint, "CHECKPOINT_FILES", 1)
+
+    real_stat = scan_checkpoint.stat_entry
+    calls = {"n": 0}
+
+    def dying_stat(entry):
+        calls["n"] += 1
+        if calls["n"] > 7:
+            raise KeyboardInterrupt
+        return real_stat(entry)
+
+    monkeypatch.setattr(scan_checkpoint, "stat_entry", dying_stat)
+    with pytest.raises(KeyboardInterrupt):
+        find_duplicates(str(tree), db_path, workers=1)
+    monkeypatch.setattr(scan_checkpoint, "stat_entry", real_stat)
+
+    assert _rows(db_path, "SELECT status, finished_at FROM scans") == [("interrupted", None)]
+    listed_before = _rows(db_path, "SELECT path FROM scan_dirs WHERE listed = 1")
+    assert listed_before
+
+    import core.file_scanner as file_scanner
+
+    real_list = file_scanner.list_dir
+    relisted = []
+
+    def tracking_list(current, *args):
+        relisted.append(current)
+        return real_list(current, *args)
+
+    monkeypatch.setattr(file_scanner, "list_dir", tracking_list)
+    resumed = find_duplicates(str(tree), db_path, resume=True)
+    assert not set(relisted) & {path for (path,) in listed_before}
+
+    fresh = find_duplicates(str(tree), str(tmp_path / "fresh.db"))
+    assert {k: resumed[k] for k in ("scanned", "skipped")} == {k: fresh[k] for k in ("scanned", "skipped")}
+    query = "SELECT hash, path FROM file_paths ORDER BY path"
+    assert _rows(db_path, query) == _rows(str(tmp_path / "fresh.db"), query)
+
+    assert _rows(db_path, "SELECT status FROM scans") == [("finished",)]
+    assert _rows(db_path, "SELECT COUNT(*) FROM scan_dirs") == [(0,)]
+    assert _rows(db_path, "SELECT COUNT(*) FROM scan_files") == [(0,)]
+
+
+def test_resume_after_hashing_interrupt_skips_committed_hashes(tmp_path, tree, monkeypatch):
+    import core.hash_engine as hash_engine
+    from core.file_hasher import compute_hash
+
+    db_path = str(tmp_path / "scan.db")
+    calls = {"n": 0}
+
+    def flaky_hash(path, *args, **kwargs):
+        calls["n"] += 1
+        if calls["n"] > 4:
+            raise KeyboardInterrupt
+        return compute_hash(path, *args, **kwargs)
+
+    monkeypatch.setattr(hash_engine, "compute_hash", flaky_hash)
+    with pytest.raises(KeyboardInterrupt):
+        find_duplicates(str(tree), db_path, batch_size=1)
+    monkeypatch.setattr(hash_engine, "compute_hash", compute_hash)
+
+    resumed = find_duplicates(str(tree), db_path, resume=True)
+    assert resumed["cached"] == 4
+    assert resumed["hashed"] == 18 - 4
+
+
+def test_new_scan_without_resume_abandons_checkpoint(tmp_path, tree):
+    db_path = str(tmp_path / "scan.db")
+    find_duplicates(str(tree), db_path)
+    scan_id, _ = scan_checkpoint.begin_scan(db_path, str(tree), {"filetypes": None, "excluded_dirs": None})
+
+    find_duplicates(str(tree), db_path)
+    statuses = _rows(db_path, "SELECT id, status FROM scans ORDER BY id")
+    assert statuses[1] == (scan_id, "abandoned")
+    assert statuses[2][1] == "finished"
+
+
+def test_checkpointed_walk_with_walkers_uses_work_stealing(tmp_path, tree, monkeypatch):
+    import core.file_scanner as file_scanner
+
+    pops = {"n": 0}
+    real_pop = file_scanner.WorkStealingQueue.pop
+
+    def counting_pop(self, worker):
+        pops["n"] += 1
+        return real_pop(self, worker)
+
+    monkeypatch.setattr(file_scanner.WorkStealingQueue, "pop", counting_pop)
+    parallel = find_duplicates(str(tree), str(tmp_path / "parallel.db"), walkers=3)
+    serial = find_duplicates(str(tree), str(tmp_path / "serial.db"))
+
+    assert pops["n"] > 0
+    assert {k: parallel[k] for k in ("scanned", "skipped")} == {k: serial[k] for k in ("scanned", "skipped")}
+    query = "SELECT hash, path FROM file_paths ORDER BY path"
+    assert _rows(str(tmp_path / "parallel.db"), query) == _rows(str(tmp_path / "serial.db"), query)
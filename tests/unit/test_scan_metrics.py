@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from core.duplicate_handler import find_duplicates
+from core.scan_metrics import ScanMetrics, COMMIT_BUCKETS
+
+
+@pytest.fixture
+def tree(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    big = b"x" * 20000
+    for i in range(3):
+        (data / f"big{i}.bin").write_bytes(big)
+    (data / "other.bin").write_bytes(b"y" * 20000)
+    (data / "unique.txt").write_text("only one of these")
+    return data
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_scan_records_stages_stat_calls_and_commits(tmp_path, tree, pipeline):
+    metrics = ScanMetrics()
+    results = find_duplicates(str(tree), str(tmp_path / "scan.db"), sample_size=1024,
+                              pipeline=pipeline, metrics=metrics)
+
+    data = metrics.to_dict()
+    assert "stat_calls" not in results
+    assert data["results"] == results
+    assert data["stat_calls"] == 5
+    assert data["stages"]["walk"]["files"] == 5
+    assert data["stages"]["fingerprint"]["files"] == 4
+    assert data["stages"]["fingerprint"]["bytes"] == 4 * 2 * 1024
+    assert data["stages"]["hash"]["files"] == 3
+    assert data["stages"]["hash"]["bytes"] == 3 * 20000
+
+    commits = data["db_commits"]
+    assert commits["count"] >= 2  # fingerprints and hashes
+    assert commits["latency_histogram"]["+Inf"] == commits["count"]
+    assert commits["rows"] >= 3 + 4
+
+
+def test_json_and_prometheus_output(tmp_path):
+    metrics = ScanMetrics()
+    metrics.add("hash", 2, 4096, seconds=0.5)
+    metrics.observe_commit(0.002, 100)
+    metrics.observe_commit(10.0, 1)
+    metrics.finish({"scanned": 2, "hashed": 2, "bytes_saved": 512, "wasted_bytes": 2048})
+
+    json_path = tmp_path / "stats.json"
+    metrics.write_json(json_path)
+    data = json.loads(json_path.read_text())
+    assert data["stages"]["hash"]["files_per_sec"] == 4.0
+    assert data["stages"]["hash"]["bytes_per_sec"] == 8192.0
+    histogram = data["db_commits"]["latency_histogram"]
+    assert histogram[str(COMMIT_BUCKETS[0])] == 0
+    assert histogram[str(COMMIT_BUCKETS[1])] == 1
+    assert histogram["+Inf"] == 2
+
+    prom_path = tmp_path / "scan.prom"
+    metrics.write_prometheus(prom_path)
+    text = prom_path.read_text()
+    assert 'duplicate_finder_scan_files{outcome="hashed"} 2' in text
+    assert "duplicate_finder_scan_unread_bytes 512" in text
+    assert "duplicate_finder_scan_wasted_bytes 2048" in text
+    assert "bytes" not in "".join(line for line in text.splitlines() if "scan_files{" in line)
+    assert 'duplicate_finder_stage_bytes{stage="hash"} 4096' in text
+    assert 'duplicate_finder_db_commit_seconds_bucket{le="+Inf"} 2' in text
+    assert "duplicate_finder_db_commit_seconds_count 2" in text
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["scan.prom", "stats.json"]
@@ -0,0 +1,115 @@
+import os
+import sqlite3
+
+import pytest
+
+from core.duplicate_handler import find_duplicates
+
+
+def _tables(db_path):
+    conn = sqlite3.connect(db_path)
+    tables = {
+        "file_paths": conn.execute("SELECT hash, path, size FROM file_paths ORDER BY path").fetchall(),
+        "fingerprints": conn.execute("SELECT path, fingerprint FROM fingerprints ORDER BY path").fetchall(),
+        "hardlinks": conn.execute("SELECT path, target FROM hardlinks ORDER BY path").fetchall(),
+        "hashes": conn.execute("SELECT hash FROM hashes ORDER BY hash").fetchall(),
+    }
+    conn.close()
+    return tables
+
+
+@pytest.fixture
+def tree(tmp_path):
+    data = tmp_path / "data"
+    for sub in ("a", "b", "c/d"):
+        (data / sub).mkdir(parents=True)
+    big = os.urandom(20000)
+    (data / "a" / "big1.bin").write_bytes(big)
+    (data / "b" / "big2.bin").write_bytes(big)
+    (data / "c" / "big3.bin").write_bytes(b"!" + big[1:])        # same size, different head
+    for i in range(10):
+        (data / "c" / "d" / f"small{i}.txt").write_text(f"copy {i % 3}")
+    (data / "a" / "unique.txt").write_text("nothing else is this long")
+    (data / "b" / "z_link_first.txt").write_text("hardlinked bytes")
+    os.link(data / "b" / "z_link_first.txt", data / "a" / "a_link_target.txt")
+    (data / "c" / "link_copy.txt").write_text("hardlinked bytes")
+    return data
+
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"workers": 3, "walkers": 2},
+    {"include_hardlinks": True, "workers": 2},
+    {"sample_size": 0},
+])
+def test_pipeline_stores_same_rows_as_serial(tmp_path, tree, options):
+    options = {"sample_size": 1024, **options}
+    serial = find_duplicates(str(tree), str(tmp_path / "serial.db"), **options)
+    piped = find_duplicates(str(tree), str(tmp_path / "piped.db"), pipeline=True, **options)
+
+    assert piped == serial
+    assert _tables(tmp_path / "piped.db") == _tables(tmp_path / "serial.db")
+
+    # Rescans, unchanged and after a rename, an edit and a new copy, still agree
+    for mutate in (None, _mutate):
+        if mutate:
+            mutate(tree)
+        serial = find_duplicates(str(tree), str(tmp_path / "serial.db"), **options)
+        piped = find_duplicates(str(tree), str(tmp_path / "piped.db"), pipeline=True, **options)
+        assert piped == serial
+        assert _tables(tmp_path / "piped.db") == _tables(tmp_path / "serial.db")
+
+
+def _mutate(tree):
+    os.rename(tree / "a" / "big1.bin", tree / "c" / "moved.bin")
+    (tree / "c" / "d" / "small0.txt").write_text("copy 9")
+    (tree / "b" / "small_new.txt").write_text("copy 1")
+    os.link(tree / "c" / "big3.bin", tree / "b" / "big3_link.bin")
+
+
+def test_pipeline_rescan_uses_cache(tmp_path, tree):
+    db_path = tmp_path / "scan.db"
+    find_duplicates(str(tree), str(db_path), pipeline=True)
+    again = find_duplicates(str(tree), str(db_path), pipeline=True)
+
+    assert again["hashed"] == 0
+    assert again["cached"] > 0
+
+
+def test_pipeline_commits_completed_work_on_interrupt(tmp_path, tree, monkeypatch):
+    import core.hash_engine as hash_engine
+    from core.file_hasher import compute_hash
+
+    calls = {"n": 0}
+
+    def flaky_hash(path, *args, **kwargs):
+        calls["n"] += 1
+        if calls["n"] > 3:
+            raise KeyboardInterrupt
+        return compute_hash(path, *args, **kwargs)
+
+    monkeypatch.setattr(hash_engine, "compute_hash", flaky_hash)
+    db_path = tmp_path / "scan.db"
+
+    with pytest.raises(KeyboardInterrupt):
+        find_duplicates(str(tree), str(db_path), pipeline=True, sample_size=0)
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM file_paths").fetchone()[0] == 3
+    conn.close()
+
+
+def test_pipeline_results_do_not_depend_on_walk_order(tmp_path, tree, monkeypatch):
+    import core.duplicate_handler as duplicate_handler
+
+    real_walk = duplicate_handler.checkpointed_walk
+
+    def reversed_walk(*args, **kwargs):
+        yield from reversed(list(real_walk(*args, **kwargs)))
+
+    serial = find_duplicates(str(tree), str(tmp_path / "serial.db"))
+    monkeypatch.setattr(duplicate_handler, "checkpointed_walk", reversed_walk)
+    piped = find_duplicates(str(tree), str(tmp_path / "piped.db"), pipeline=True)
+
+    assert piped == serial
+    assert _tables(tmp_path / "piped.db") == _tables(tmp_path / "serial.db")
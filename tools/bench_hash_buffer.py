@@ -0,0 +1,88 @@
+# tools/bench_hash_buffer.py
+"""
+Measures compute_hash throughput against read buffer size.
+
+Hashes either an existing directory (--dir, to use your real file-size mix) or a
+generated sample set shaped like a typical share: many small files, some medium
+files and a few large ones. Files are read once first, so numbers reflect the
+hashing path (page cache, copies, per-chunk overhead) rather than cold disk I/O.
+
+    python tools/bench_hash_buffer.py
+    python tools/bench_hash_buffer.py --dir ~/Media --algo sha256 --mmap
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from core.file_hasher import compute_hash
+
+# (file count, file size) buckets for the generated sample set, scaled by --scale
+DISTRIBUTION = [
+    (400, 4 * 1024),
+    (200, 64 * 1024),
+    (40, 1024 * 1024),
+    (8, 16 * 1024 * 1024),
+    (2, 128 * 1024 * 1024),
+]
+
+BUFFER_SIZES = [8 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024]
+
+
+def make_sample_set(root, scale):
+    paths = []
+    for count, size in DISTRIBUTION:
+        for i in range(max(1, int(count * scale))):
+            path = os.path.join(root, f"{size}_{i}.bin")
+            with open(path, "wb") as f:
+                f.write(os.urandom(min(size, 1024 * 1024)) * max(1, size // (1024 * 1024)))
+            paths.append(path)
+    return paths
+
+
+def list_files(directory):
+    paths = []
+    for dirpath, _, names in os.walk(directory):
+        paths.extend(os.path.join(dirpath, name) for name in names)
+    return [p for p in paths if os.path.isfile(p)]
+
+
+def run(paths, algo, use_mmap, repeat):
+    total = sum(os.path.getsize(p) for p in paths)
+    for p in paths:  # warm the page cache
+        compute_hash(p, algo)
+
+    print(f"{len(paths)} files, {total / 1024 / 1024:.1f} MiB, algo={algo}, mmap={use_mmap}")
+    print(f"{'buffer':>10}  {'seconds':>8}  {'MiB/s':>8}")
+    for buffer_size in BUFFER_SIZES:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for p in paths:
+                compute_hash(p, algo, buffer_size=buffer_size, use_mmap=use_mmap)
+            best = min(best, time.perf_counter() - start)
+        print(f"{buffer_size // 1024:>8}K  {best:>8.3f}  {total / 1024 / 1024 / best:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compute_hash throughput vs buffer size")
+    parser.add_argument("--dir", help="Hash files from this directory instead of a generated set")
+    parser.add_argument("--scale", type=float, default=0.25, help="Scale factor for the generated set")
+    parser.add_argument("--algo", default="md5")
+    parser.add_argument("--mmap", action="store_true", help="Benchmark the mmap path")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.dir:
+        run(list_files(args.dir), args.algo, args.mmap, args.repeat)
+        return
+
+    with tempfile.TemporaryDirectory() as root:
+        run(make_sample_set(root, args.scale), args.algo, args.mmap, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
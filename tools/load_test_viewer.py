@@ -0,0 +1,56 @@
+# tools/load_test_viewer.py
+"""
+Fires concurrent GET requests at a running viewer and reports throughput and latency
+per concurrency level. If page views serialized (e.g. on a blocked event loop or a
+shared connection), requests/s would stay flat while latency grows with concurrency.
+
+    uvicorn viewer.main:app --workers 1
+    python tools/load_test_viewer.py --url http://127.0.0.1:8000/ --concurrency 1 4 16
+    python tools/load_test_viewer.py --url "http://127.0.0.1:8000/api/duplicates?sort=wasted"
+"""
+import argparse
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def fetch(url):
+    start = time.perf_counter()
+    with urllib.request.urlopen(url) as response:
+        response.read()
+        status = response.status
+    return time.perf_counter() - start, status
+
+
+def run_level(url, concurrency, requests):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(fetch, [url] * requests))
+        elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, status in results if status >= 400)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{concurrency:>11}  {requests / elapsed:>8.1f}  {statistics.median(latencies) * 1000:>8.1f}  "
+          f"{p95 * 1000:>8.1f}  {errors:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the duplicate viewer")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/", help="Page or API URL to request")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16],
+                        help="Concurrent clients per run (default: 1 4 16)")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    args = parser.parse_args()
+
+    fetch(args.url)  # warm up: schema check, caches, pooled connections
+
+    print(f"GET {args.url}")
+    print(f"{'concurrency':>11}  {'req/s':>8}  {'p50 ms':>8}  {'p95 ms':>8}  {'errors':>6}")
+    for concurrency in args.concurrency:
+        run_level(args.url, concurrency, args.requests)
+
+
+if __name__ == "__main__":
+    main()
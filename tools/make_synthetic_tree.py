@@ -0,0 +1,119 @@
+# tools/make_synthetic_tree.py
+"""
+Generates a reproducible directory tree for benchmarking scans.
+
+File sizes are drawn from a weighted distribution, a share of the files are byte-for-byte
+copies of earlier ones (spread over other directories), and a share are hardlinks.
+The same --seed always produces the same tree, so timings from different commits
+are comparable.
+
+    python tools/make_synthetic_tree.py /tmp/bench_tree --files 20000 --dup-ratio 0.3
+    python tools/make_synthetic_tree.py /tmp/media --sizes 64K:50,4M:40,64M:10 --depth 4 --hardlink-ratio 0.05
+"""
+import argparse
+import json
+import os
+import random
+
+# size:weight pairs, e.g. mostly small files with a tail of large ones
+DEFAULT_SIZES = "1K:40,16K:35,256K:20,4M:5"
+
+UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+EXTENSIONS = [".txt", ".jpg", ".png", ".pdf", ".mp3", ".bin"]
+
+
+def parse_size(text):
+    """Parses 4096, 64K, 4M or 1G into bytes."""
+    text = text.strip().upper()
+    unit = text[-1] if text[-1] in UNITS else ""
+    return int(float(text[:-1] if unit else text) * UNITS[unit])
+
+
+def parse_distribution(spec):
+    """Parses "1K:40,4M:5" into ([sizes], [weights])."""
+    sizes, weights = [], []
+    for part in spec.split(","):
+        size, _, weight = part.partition(":")
+        sizes.append(parse_size(size))
+        weights.append(float(weight or 1))
+    return sizes, weights
+
+
+def _content(content_id, size):
+    """Deterministic bytes for a content id; copies of one id are identical."""
+    block = random.Random(content_id).randbytes(min(size, 64 * 1024))
+    return (block * (size // len(block) + 1))[:size] if block else b""
+
+
+def _directories(root, depth, fanout):
+    """All directories of a tree fanout wide and depth deep below root, root included."""
+    dirs = [root]
+    level = [root]
+    for _ in range(depth):
+        level = [os.path.join(parent, f"d{i}") for parent in level for i in range(fanout)]
+        dirs += level
+    return dirs
+
+
+def generate_tree(root, files=1000, sizes=DEFAULT_SIZES, dup_ratio=0.25, depth=3, fanout=4,
+                  hardlink_ratio=0.0, seed=42):
+    """
+    Writes files under root and returns a summary dict (files, bytes, unique contents,
+    copies, hardlinks, directories). dup_ratio of the files repeat an earlier file's
+    contents and hardlink_ratio of them are hardlinks to an earlier file.
+    """
+    rng = random.Random(seed)
+    size_choices, weights = parse_distribution(sizes)
+    dirs = _directories(root, depth, fanout)
+    for directory in dirs:
+        os.makedirs(directory, exist_ok=True)
+
+    written = []  # (path, content_id, size) of regular files
+    summary = {"files": 0, "bytes": 0, "unique": 0, "copies": 0, "hardlinks": 0, "directories": len(dirs)}
+
+    for i in range(files):
+        path = os.path.join(rng.choice(dirs), f"f{i}{rng.choice(EXTENSIONS)}")
+        roll = rng.random()
+
+        if written and roll < hardlink_ratio:
+            os.link(rng.choice(written)[0], path)
+            summary["hardlinks"] += 1
+        else:
+            if written and roll < hardlink_ratio + dup_ratio:
+                _, content_id, size = rng.choice(written)
+                summary["copies"] += 1
+            else:
+                content_id, size = i, rng.choices(size_choices, weights)[0]
+                summary["unique"] += 1
+            with open(path, "wb") as f:
+                f.write(_content(content_id + seed * 1_000_003, size))
+            written.append((path, content_id, size))
+            summary["bytes"] += size
+        summary["files"] += 1
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic tree with known duplicates")
+    parser.add_argument("root", help="Directory to create the tree in")
+    parser.add_argument("--files", type=int, default=1000, help="Number of files (default: 1000)")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"size:weight distribution of file sizes (default: {DEFAULT_SIZES})")
+    parser.add_argument("--dup-ratio", type=float, default=0.25,
+                        help="Share of files that copy an earlier file's contents (default: 0.25)")
+    parser.add_argument("--depth", type=int, default=3, help="Directory levels below the root (default: 3)")
+    parser.add_argument("--fanout", type=int, default=4, help="Subdirectories per directory (default: 4)")
+    parser.add_argument("--hardlink-ratio", type=float, default=0.0,
+                        help="Share of files that are hardlinks to an earlier file (default: 0)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    summary = generate_tree(args.root, args.files, args.sizes, args.dup_ratio, args.depth,
+                            args.fanout, args.hardlink_ratio, args.seed)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
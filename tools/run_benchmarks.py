@@ -0,0 +1,201 @@
+# tools/run_benchmarks.py
+"""
+Times the scanner's and viewer's hot paths on a synthetic tree and writes the results
+as JSON, so runs from different commits can be compared.
+
+Benchmarks: walk_files, compute_hash over every file, store_batch_in_db, a full
+find_duplicates scan and an unchanged rescan, generate_report and a top-100 report,
+each export format, merging two copies of the scan DB, and the viewer's
+load_duplicates and first results page. Each is run --repeat times and the fastest
+run is kept.
+
+    python tools/run_benchmarks.py --files 20000 --output bench.json
+    python tools/run_benchmarks.py --tree ~/Media --repeat 1 --output media.json
+    python tools/run_benchmarks.py --output new.json --compare bench.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TOOLS_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "src"))
+sys.path.insert(0, REPO_DIR)
+
+import logging
+
+from core.file_scanner import walk_files, stat_entry
+from core.file_hasher import compute_hash
+from core.duplicate_handler import store_batch_in_db, find_duplicates
+from core.report_generator import generate_report, write_report
+from core.db_exporter import iter_export, EXPORT_FORMATS
+from core.db_merge import merge_databases
+from db_utils.db_utils import create_db
+from viewer.utils import load_duplicates, query_duplicate_groups
+from make_synthetic_tree import generate_tree, DEFAULT_SIZES
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def timed(func, repeat, setup=None):
+    """Runs setup() (untimed) then func() repeat times; returns (best seconds, all runs, last result)."""
+    runs = []
+    result = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = func()
+        runs.append(time.perf_counter() - start)
+    return min(runs), runs, result
+
+
+def run_benchmarks(root, workdir, repeat=3, algo="md5"):
+    results = {}
+
+    def record(name, func, items=None, setup=None):
+        best, runs, result = timed(func, repeat, setup)
+        count = items(result) if items else None
+        results[name] = {
+            "seconds": round(best, 6),
+            "runs": [round(r, 6) for r in runs],
+            "items": count,
+            "items_per_sec": round(count / best, 1) if count and best else None,
+        }
+        print(f"{name:<28} {best:>9.3f}s" + (f"  {count / best:>12.1f}/s" if count and best else ""))
+        return result
+
+    paths = record("walk_files", lambda: list(walk_files(root)), len)
+    total_bytes = sum(os.path.getsize(p) for p in paths)
+
+    hashes = record("compute_hash", lambda: [compute_hash(p, algo) for p in paths], len)
+    results["compute_hash"]["bytes_per_sec"] = round(total_bytes / results["compute_hash"]["seconds"], 1)
+
+    rows = [(h, *stat_entry(p)) for h, p in zip(hashes, paths) if h]
+    store_db = os.path.join(workdir, "store.db")
+
+    def fresh_store_db():
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(store_db + suffix):
+                os.remove(store_db + suffix)
+        create_db(store_db)
+
+    record("store_batch_in_db", lambda: store_batch_in_db(store_db, rows, algo), lambda _: len(rows),
+           setup=fresh_store_db)
+
+    scan_db = os.path.join(workdir, "scan.db")
+
+    def fresh_scan_db():
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(scan_db + suffix):
+                os.remove(scan_db + suffix)
+
+    record("find_duplicates", lambda: find_duplicates(root, scan_db, hash_algo=algo),
+           lambda r: r["scanned"], setup=fresh_scan_db)
+    record("find_duplicates_rescan", lambda: find_duplicates(root, scan_db, hash_algo=algo),
+           lambda r: r["scanned"])
+
+    record("generate_report", lambda: generate_report(scan_db), lambda r: r.count("\n") if r else 0)
+    record("write_report_top100", lambda: write_report(scan_db, io.StringIO(), top=100))
+    for fmt in EXPORT_FORMATS:
+        record(f"export_{fmt}", lambda fmt=fmt: sum(len(chunk) for chunk in iter_export(scan_db, fmt)))
+        results[f"export_{fmt}"]["bytes"] = sum(len(chunk) for chunk in iter_export(scan_db, fmt))
+
+    merge_db = os.path.join(workdir, "merged.db")
+
+    def fresh_merge_db():
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(merge_db + suffix):
+                os.remove(merge_db + suffix)
+
+    record("merge_databases", lambda: merge_databases(merge_db, [("a", scan_db), ("b", scan_db)]),
+           lambda merged: sum(merged.values()), setup=fresh_merge_db)
+
+    record("viewer_load_duplicates", lambda: load_duplicates(scan_db), len)
+    record("viewer_first_page", lambda: query_duplicate_groups(scan_db)[0], len)
+
+    return results, {"files": len(paths), "bytes": total_bytes}
+
+
+def compare(new, old):
+    """Prints the speed ratio of every benchmark present in both result files."""
+    print(f"\n{'benchmark':<28} {'old s':>9} {'new s':>9} {'speedup':>8}")
+    for name, result in new["results"].items():
+        if name in old.get("results", {}):
+            before, after = old["results"][name]["seconds"], result["seconds"]
+            ratio = before / after if after else float("inf")
+            print(f"{name:<28} {before:>9.3f} {after:>9.3f} {ratio:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scanning, storage, reports, exports and the viewer")
+    parser.add_argument("--tree", help="Benchmark an existing directory instead of generating one")
+    parser.add_argument("--files", type=int, default=5000, help="Files in the generated tree (default: 5000)")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="size:weight distribution for the generated tree")
+    parser.add_argument("--dup-ratio", type=float, default=0.25)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--hardlink-ratio", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--algo", default="md5")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark; the fastest is kept")
+    parser.add_argument("--output", help="Write results JSON here (default: stdout only)")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    # Scan progress logging would drown out the timings
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        tree_params = None
+        root = args.tree
+        if not root:
+            root = os.path.join(workdir, "tree")
+            tree_params = {
+                "files": args.files, "sizes": args.sizes, "dup_ratio": args.dup_ratio, "depth": args.depth,
+                "fanout": args.fanout, "hardlink_ratio": args.hardlink_ratio, "seed": args.seed,
+            }
+            summary = generate_tree(root, **tree_params)
+            print(f"Generated {summary['files']} files ({summary['bytes'] / 1024 / 1024:.1f} MiB) in {root}")
+
+        results, tree_stats = run_benchmarks(root, workdir, args.repeat, args.algo)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "algo": args.algo,
+            "repeat": args.repeat,
+            "tree": tree_params or {"path": args.tree},
+            **tree_stats,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
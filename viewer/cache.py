@@ -0,0 +1,87 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+# Memory budget for cached viewer results, overridable with VIEWER_CACHE_MB
+DEFAULT_CACHE_MB = 64
+
+
+def db_state(db_path):
+    """
+    Identifies one version of a database: its path plus mtime and size. The -wal file
+    is included because scans in WAL mode change it long before the main file.
+    """
+    state = [str(db_path)]
+    for path in (str(db_path), f"{db_path}-wal"):
+        try:
+            st = os.stat(path)
+            state += [st.st_mtime_ns, st.st_size]
+        except OSError:
+            state += [None, None]
+    return tuple(state)
+
+
+def approx_size(value):
+    """Rough deep size in bytes of the containers, strings and numbers the viewer caches."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approx_size(item) for item in value)
+    return size
+
+
+class ResultCache:
+    """
+    Memory-bounded LRU of computed viewer results. Keys start with db_state(), so a
+    database that is replaced or modified simply stops matching its old entries,
+    which then age out; clear() drops them right away on upload or reset.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (value, size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_or_compute(self, db_path, name, args, compute):
+        """Returns the cached compute() result for (db version, name, args), computing it on a miss."""
+        key = (db_state(db_path), name, args)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+
+        value = compute()
+        size = approx_size(value)
+        with self.lock:
+            if size <= self.max_bytes and key not in self.entries:
+                self.entries[key] = (value, size)
+                self.bytes += size
+                while self.bytes > self.max_bytes:
+                    _, (_, evicted) = self.entries.popitem(last=False)
+                    self.bytes -= evicted
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+cache = ResultCache(int(float(os.getenv("VIEWER_CACHE_MB", DEFAULT_CACHE_MB)) * 1024 * 1024))
@@ -1,18 +1,20 @@
 import os
-import sqlite3
-import csv
-import io
 import shutil
+import time
 from pathlib import Path
 from typing import List, Optional
 from datetime import datetime
 
 from fastapi import FastAPI, Request, Form, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import RedirectResponse, HTMLResponse, StreamingResponse, PlainTextResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
-from viewer.utils import load_duplicates
+from viewer.cache import cache
+from viewer.timing import timings
+from viewer.utils import ensure_schema, check_integrity, check_viewable, read_as_is, open_read_only, pool, load_summary, query_duplicate_groups, parse_cursor, PAGE_SIZE
+from core.db_exporter import iter_export, render_export, gzip_stream, MEDIA_TYPES, FILE_EXTENSIONS  # src/ is on sys.path via viewer.utils
 
 app = FastAPI()
 
@@ -23,6 +25,17 @@ DEFAULT_DB_PATH = BASE_DIR / "test_hashes.db"
 UPLOAD_DIR = BASE_DIR / "uploaded"
 EXPORT_DIR = BASE_DIR / "exported"
 
+
+# Uploads are streamed to disk in chunks and refused beyond VIEWER_MAX_UPLOAD_MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(float(os.getenv("VIEWER_MAX_UPLOAD_MB", 4096)) * 1024 * 1024)
+
+# Room for the multipart boundaries and part headers around the uploaded file
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+# Directories /open-db may open databases from (os.pathsep-separated); unset disables /open-db
+DB_ROOTS = [Path(root).resolve() for root in os.getenv("VIEWER_DB_ROOTS", "").split(os.pathsep) if root]
+
 UPLOAD_DIR.mkdir(exist_ok=True)
 EXPORT_DIR.mkdir(exist_ok=True)
 
@@ -33,59 +46,223 @@ CURRENT_DB_PATH = DEFAULT_DB_PATH
 LAST_UPLOAD_FILENAME = None
 
 
+@app.middleware("http")
+async def limit_uploads(request: Request, call_next):
+    """
+    Refuses an oversized upload from its Content-Length header, before the body is
+    read: the form parser would otherwise spool all of it to a temp file first.
+    Uploads without a Content-Length (chunked bodies) are refused outright, so the
+    declared length, which the server holds the body to, always bounds what is read.
+    """
+    if request.method == "POST" and request.url.path == "/upload":
+        length = request.headers.get("content-length")
+        if length is None or not length.isdigit():
+            return PlainTextResponse("Content-Length required", status_code=411)
+        if int(length) > MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD:
+            print(f"Upload refused: request of {length} bytes is larger than {MAX_UPLOAD_BYTES} bytes")
+            return RedirectResponse(url="/?msg=too_large", status_code=303)
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    """
+    With VIEWER_TIMING=1, times every request into /api/timings and a Server-Timing
+    header. Streamed exports are timed up to their first byte.
+    """
+    if not timings.enabled:
+        return await call_next(request)
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    timings.record(f"{request.method} {request.url.path}", elapsed)
+    response.headers["Server-Timing"] = f"app;dur={elapsed * 1000:.1f}"
+    return response
+
+
+def _page_or_error(after=None, limit=PAGE_SIZE, sort="count", order="desc", prefix=None, ext=None, min_count=2):
+    """
+    Runs query_duplicate_groups on the active DB, through the result cache;
+    returns (groups, next_cursor, error).
+    """
+    db_path = CURRENT_DB_PATH
+    try:
+        args = (limit, parse_cursor(after), sort, order, prefix, ext, min_count)
+        ensure_schema(db_path)
+        groups, next_cursor = cache.get_or_compute(
+            db_path, "page", args, lambda: query_duplicate_groups(db_path, *args)
+        )
+        return groups, next_cursor, None
+    except FileNotFoundError:
+        return [], None, None
+    except ValueError as e:
+        return [], None, str(e)
+    except Exception as e:
+        print(f"Error reading database: {e}")
+        return [], None, None
+
+
 @app.get("/", response_class=HTMLResponse)
-def home(request: Request, msg: str = None):
+def home(request: Request, msg: str = None, sort: str = "count", order: str = "desc",
+         prefix: str = None, ext: str = None, min_count: int = 2, done: int = 0, failed: int = 0):
     db_file = CURRENT_DB_PATH
-    data = load_duplicates(db_file)
-
-    total_hashes = len(data)
-    total_files = sum(len(paths) for paths in data.values())
-    avg_files_per_hash = round(total_files / total_hashes, 2) if total_hashes else 0
+    filters = {"sort": sort, "order": order, "prefix": prefix or "", "ext": ext or "", "min_count": min_count}
 
-    # Detect paths that appear in multiple hashes (for highlighting)
-    from collections import Counter
-    all_paths = [path for paths in data.values() for path in paths]
-    path_counts = Counter(all_paths)
-    duplicate_paths = set(p for p, c in path_counts.items() if c > 1)
+    # Only the first page is rendered here; the page fetches the rest from /api/duplicates
+    groups, next_cursor, _ = _page_or_error(None, PAGE_SIZE, sort, order, prefix, ext, min_count)
 
     return templates.TemplateResponse("index.html", {
         "request": request,
-        "duplicates": data,
+        "groups": groups,
+        "next_cursor": next_cursor,
+        "filters": filters,
         "db_filename": LAST_UPLOAD_FILENAME or db_file.name,
         "toast_msg": msg,
+        "toast_done": done,
+        "toast_failed": failed,
         "is_uploaded": bool(LAST_UPLOAD_FILENAME),
-        "duplicate_paths": duplicate_paths,
-        "summary": {
-            "hashes": total_hashes,
-            "files": total_files,
-            "avg": avg_files_per_hash
-        }
+        "summary": cache.get_or_compute(db_file, "summary", (), lambda: load_summary(db_file))
     })
 
 
+@app.get("/api/duplicates")
+def api_duplicates(after: str = None, limit: int = PAGE_SIZE, sort: str = "count", order: str = "desc",
+                   prefix: str = None, ext: str = None, min_count: int = 2):
+    """One page of duplicate groups; pass the returned "next" cursor as after for the following page."""
+    groups, next_cursor, error = _page_or_error(after, limit, sort, order, prefix, ext, min_count)
+    if error:
+        return JSONResponse({"error": error}, status_code=400)
+    return {"groups": groups, "next": next_cursor}
+
+
+@app.get("/api/cache-stats")
+def cache_stats():
+    """Hit/miss counters and memory use of the viewer result cache."""
+    return cache.stats()
+
+
+@app.get("/api/timings")
+def request_timings():
+    """Per-route latencies recorded by the timing middleware (enable with VIEWER_TIMING=1)."""
+    return timings.stats()
+
+
+def _save_upload(src, dest):
+    """
+    Copies an uploaded file to dest in chunks, through a .part file so a failed or
+    refused upload never replaces the previous copy. Returns None on success, or the
+    toast message key explaining why the upload was refused.
+    """
+    partial = dest.with_name(dest.name + ".part")
+    written = 0
+    try:
+        with open(partial, "wb") as out:
+            while chunk := src.read(UPLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if written > MAX_UPLOAD_BYTES:
+                    print(f"Upload refused: larger than {MAX_UPLOAD_BYTES} bytes")
+                    return "too_large"
+                out.write(chunk)
+
+        problem = check_integrity(partial)
+        if problem:
+            print(f"Upload refused: not a valid SQLite database ({problem})")
+            return "invalid"
+
+        # Connections to the file about to be replaced would read a mix of old and new pages
+        pool.clear()
+        os.replace(partial, dest)
+        return None
+    finally:
+        if partial.exists():
+            partial.unlink()
+
+
+def _activate_db(db_path, display_name):
+    global CURRENT_DB_PATH, LAST_UPLOAD_FILENAME
+    CURRENT_DB_PATH = db_path
+    LAST_UPLOAD_FILENAME = display_name
+    cache.clear()
+
+
 @app.post("/upload")
 async def upload_db(db_file: UploadFile = File(...)):
-    global CURRENT_DB_PATH, LAST_UPLOAD_FILENAME
+    # Only the base name: a crafted filename must not write outside UPLOAD_DIR
+    filename = Path(db_file.filename or "").name
+    if not filename:
+        return RedirectResponse(url="/?msg=invalid", status_code=303)
+
+    file_location = UPLOAD_DIR / filename
+    if db_file.size is not None and db_file.size > MAX_UPLOAD_BYTES:
+        return RedirectResponse(url="/?msg=too_large", status_code=303)
 
-    file_location = UPLOAD_DIR / db_file.filename
-    with open(file_location, "wb") as f:
-        content = await db_file.read()
-        f.write(content)
+    refused = await run_in_threadpool(_save_upload, db_file.file, file_location)
+    if refused:
+        return RedirectResponse(url=f"/?msg={refused}", status_code=303)
 
-    CURRENT_DB_PATH = file_location
-    LAST_UPLOAD_FILENAME = db_file.filename
+    # Older scanner DBs get their indexes before the first page view
+    await run_in_threadpool(ensure_schema, file_location)
+    _activate_db(file_location, filename)
 
     return RedirectResponse(url="/?msg=upload", status_code=303)
 
 
+@app.post("/open-db")
+def open_db(db_path: str = Form(...)):
+    """
+    Views a database already on the server (e.g. a scanner index) in place, without
+    copying it. Only paths under VIEWER_DB_ROOTS are opened, and the file is read as
+    it is: a database older than the viewer's queries is refused, never migrated.
+    """
+    path = Path(db_path).expanduser().resolve()
+    if not any(path.is_relative_to(root) for root in DB_ROOTS):
+        return RedirectResponse(url="/?msg=forbidden", status_code=303)
+    if not path.is_file():
+        return RedirectResponse(url="/?msg=invalid", status_code=303)
+    problem = check_viewable(path)
+    if problem:
+        print(f"Open refused: {path} is not a viewable scan database ({problem})")
+        return RedirectResponse(url="/?msg=invalid", status_code=303)
+
+    read_as_is(path)
+    pool.clear()
+    _activate_db(path, str(path))
+
+    return RedirectResponse(url="/?msg=opened", status_code=303)
+
+
 @app.post("/reset-db")
 def reset_to_default():
-    global CURRENT_DB_PATH, LAST_UPLOAD_FILENAME
-    CURRENT_DB_PATH = DEFAULT_DB_PATH
-    LAST_UPLOAD_FILENAME = None
+    _activate_db(DEFAULT_DB_PATH, None)
+    pool.clear()
     return RedirectResponse(url="/?msg=reset", status_code=303)
 
 
+def _apply_file_action(action, paths):
+    """Deletes or copies out each path and logs the ones that succeeded; returns (successful, failed)."""
+    successful = []
+    failed = []
+
+    for path in paths:
+        try:
+            if action == "delete":
+                os.remove(path)
+            elif action == "export":
+                EXPORT_DIR.mkdir(exist_ok=True)
+                shutil.copy(path, EXPORT_DIR / Path(path).name)
+            successful.append(path)
+        except Exception as e:
+            failed.append((path, str(e)))
+
+    # Log file paths
+    logfile = EXPORT_DIR / f"{action}ed.log"
+    with open(logfile, "a") as log:
+        for path in successful:
+            log.write(f"{datetime.now().isoformat()} | {path}\n")
+
+    return successful, failed
+
+
 @app.post("/file-action", response_class=HTMLResponse)
 async def handle_file_action(
     name: Request,
@@ -106,93 +283,63 @@ async def handle_file_action(
             "paths": paths
         })
 
-    # Confirmed: proceed with delete/export
-    successful = []
-    failed = []
+    # Confirmed: proceed with delete/export, off the event loop
+    successful, failed = await run_in_threadpool(_apply_file_action, action, paths)
+    for path, error in failed:
+        print(f"Could not {action} {path}: {error}")
+    return RedirectResponse(url=f"/?msg={action}&done={len(successful)}&failed={len(failed)}", status_code=303)
 
-    for path in paths:
-        try:
-            if action == "delete":
-                os.remove(path)
-            elif action == "export":
-                EXPORT_DIR.mkdir(exist_ok=True)
-                shutil.copy(path, EXPORT_DIR / Path(path).name)
-            successful.append(path)
-        except Exception as e:
-            failed.append((path, str(e)))
-
-    # Log file paths
-    logfile = EXPORT_DIR / f"{action}ed.log"
-    with open(logfile, "a") as log:
-        for path in successful:
-            log.write(f"{datetime.now().isoformat()} | {path}\n")
 
-    return RedirectResponse(url=f"/?msg={action}", status_code=303)
+def _read_only_export(db_path, fmt):
+    """
+    iter_export over a dedicated read-only connection, closed when the response ends.
+    Not pooled: a download the client abandons could leave its cursor holding a snapshot.
+    """
+    conn = open_read_only(db_path)
+    try:
+        yield from iter_export(db_path, fmt, conn=conn)
+    finally:
+        conn.close()
 
 
-@app.get("/export/csv")
-def export_csv():
+def _export_response(fmt, gzip=False):
+    """
+    Streams an export straight from the database, one hash group at a time; a missing
+    database exports as empty rather than being created.
+    """
     try:
-        conn = sqlite3.connect(CURRENT_DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT hash FROM hashes")
-        hashes = cursor.fetchall()
-
-        stream = io.StringIO()
-        writer = csv.writer(stream)
-        writer.writerow(["hash", "paths"])
-
-        for (hash_val,) in hashes:
-            cursor.execute("SELECT path FROM file_paths WHERE hash = ?", (hash_val,))
-            paths = [row[0] for row in cursor.fetchall()]
-            writer.writerow([hash_val, ";".join(paths)])
-
-        stream.seek(0)
-        return StreamingResponse(stream, media_type="text/csv", headers={
-            "Content-Disposition": "attachment; filename=duplicates.csv"
-        })
-
+        ensure_schema(CURRENT_DB_PATH)
+        chunks = _read_only_export(CURRENT_DB_PATH, fmt)
+    except FileNotFoundError:
+        chunks = render_export([], fmt)
     except Exception as e:
         return PlainTextResponse(str(e), status_code=500)
 
+    filename = f"duplicates.{FILE_EXTENSIONS[fmt]}"
+    if gzip:
+        return StreamingResponse(gzip_stream(chunks), media_type="application/gzip", headers={
+            "Content-Disposition": f"attachment; filename={filename}.gz"
+        })
+
+    headers = {"Content-Disposition": f"attachment; filename={filename}"} if fmt == "csv" else {}
+    return StreamingResponse(chunks, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+
+@app.get("/export/csv")
+def export_csv(gzip: bool = False):
+    return _export_response("csv", gzip)
+
 
 @app.get("/export/json")
-def export_json():
-    try:
-        conn = sqlite3.connect(CURRENT_DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT hash FROM hashes")
-        hashes = cursor.fetchall()
-
-        export_data = {}
-        for (hash_val,) in hashes:
-            cursor.execute("SELECT path FROM file_paths WHERE hash = ?", (hash_val,))
-            paths = [row[0] for row in cursor.fetchall()]
-            export_data[hash_val] = paths
-
-        return JSONResponse(content=export_data)
-    except Exception as e:
-        return PlainTextResponse(str(e), status_code=500)
+def export_json(gzip: bool = False):
+    return _export_response("json", gzip)
+
+
+@app.get("/export/ndjson")
+def export_ndjson(gzip: bool = False):
+    return _export_response("ndjson", gzip)
 
 
 @app.get("/export/markdown")
-def export_markdown():
-    try:
-        conn = sqlite3.connect(CURRENT_DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT hash FROM hashes")
-        hashes = cursor.fetchall()
-
-        lines = ["# Duplicate Summary", ""]
-
-        for (hash_val,) in hashes:
-            cursor.execute("SELECT path FROM file_paths WHERE hash = ?", (hash_val,))
-            paths = [row[0] for row in cursor.fetchall()]
-            if len(paths) > 1:
-                lines.append(f"### Hash: `{hash_val}`")
-                lines.extend([f"- {path}" for path in paths])
-                lines.append("")
-
-        return PlainTextResponse("\n".join(lines), media_type="text/markdown")
-    except Exception as e:
-        return PlainTextResponse(str(e), status_code=500)
+def export_markdown(gzip: bool = False):
+    return _export_response("markdown", gzip)
@@ -0,0 +1,54 @@
+import os
+import threading
+from collections import deque
+
+# Latest durations kept per route for the percentiles in stats()
+TIMING_WINDOW = 1000
+
+
+class RequestTimings:
+    """
+    Per-route request durations for the opt-in timing middleware (VIEWER_TIMING=1).
+    Keeps a count, total and max per "METHOD /path" plus a window of recent durations
+    for p50/p95, so a slow route shows up without attaching a profiler.
+    """
+
+    def __init__(self, enabled=False, window=TIMING_WINDOW):
+        self.enabled = enabled
+        self.window = window
+        self.routes = {}
+        self.lock = threading.Lock()
+
+    def record(self, route, seconds):
+        with self.lock:
+            entry = self.routes.get(route)
+            if entry is None:
+                entry = self.routes[route] = {"count": 0, "total": 0.0, "max": 0.0,
+                                              "recent": deque(maxlen=self.window)}
+            entry["count"] += 1
+            entry["total"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+            entry["recent"].append(seconds)
+
+    def clear(self):
+        with self.lock:
+            self.routes.clear()
+
+    def stats(self):
+        """Per-route count and avg/p50/p95/max in milliseconds, slowest average first."""
+        with self.lock:
+            rows = []
+            for route, entry in self.routes.items():
+                recent = sorted(entry["recent"])
+                rows.append({
+                    "route": route,
+                    "count": entry["count"],
+                    "avg_ms": round(entry["total"] / entry["count"] * 1000, 3),
+                    "p50_ms": round(recent[len(recent) // 2] * 1000, 3),
+                    "p95_ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000, 3),
+                    "max_ms": round(entry["max"] * 1000, 3),
+                })
+        return {"enabled": self.enabled, "routes": sorted(rows, key=lambda row: row["avg_ms"], reverse=True)}
+
+
+timings = RequestTimings(enabled=os.getenv("VIEWER_TIMING", "").lower() in ("1", "true", "yes"))
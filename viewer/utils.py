@@ -1,23 +1,343 @@
+import os
 import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import quote
+
+# Reuse the scanner's schema code from src/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from db_utils.db_utils import migrate_db, read_duplicate_summary, SCHEMA_VERSION
+from core.db_exporter import iter_groups
+
+# Duplicate groups returned per page by the viewer API
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Sort keys for duplicate groups: copies per hash, or bytes reclaimable by keeping one copy
+SORT_KEYS = {
+    "count": "copies",
+    "wasted": "wasted",
+}
+
+# Idle read-only connections kept per database
+POOL_SIZE = 8
+
+# Read connections map up to this much of the file and cache this many KiB of pages
+READ_MMAP_SIZE = 256 * 1024 * 1024
+READ_CACHE_KIB = 16 * 1024
+
+# (path, mtime_ns, size) of databases already brought up to the current schema
+_migrated = set()
+
+# Databases opened in place on the server: read as they are, never migrated
+_read_as_is = set()
+
+# file_paths columns the viewer's queries select
+VIEWER_COLUMNS = ("hash", "path", "size")
+
+
+def open_read_only(db_path):
+    """Opens db_path with mode=ro, so a viewer bug can never write to a scanner index."""
+    uri = f"file:{quote(os.path.abspath(db_path))}?mode=ro"
+    # Pooled connections are handed to whichever worker thread serves the next request
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn.execute(f"PRAGMA mmap_size = {READ_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = -{READ_CACHE_KIB}")
+    return conn
+
+
+class ReadOnlyPool:
+    """
+    Reuses read-only connections between requests instead of opening one per query.
+    At most size idle connections are kept per database; busy ones are not capped,
+    each request thread simply opens another. clear() closes everything, e.g. when the
+    file behind a path is replaced by an upload.
+    """
+
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self.idle = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def connection(self, db_path):
+        key = str(db_path)
+        with self.lock:
+            conns = self.idle.get(key)
+            conn = conns.pop() if conns else None
+            generation = self.generation
+        if conn is None:
+            conn = open_read_only(key)
+
+        try:
+            yield conn
+        finally:
+            with self.lock:
+                idle = self.idle.setdefault(key, [])
+                if generation == self.generation and len(idle) < self.size and not conn.in_transaction:
+                    idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def clear(self):
+        with self.lock:
+            conns = [conn for idle in self.idle.values() for conn in idle]
+            self.idle = {}
+            self.generation += 1
+        for conn in conns:
+            conn.close()
+
+
+pool = ReadOnlyPool()
+
+
+def ensure_schema(db_path):
+    """
+    Upgrades a database (e.g. an old uploaded one) to the current schema so its
+    lookups by hash and path are indexed. Cheap no-op once a file has been checked.
+    This is the viewer's only write: it opens a writable connection just for existing
+    databases behind SCHEMA_VERSION, so current ones can sit on read-only storage.
+    Raises FileNotFoundError for a missing database instead of creating an empty one.
+    Databases registered with read_as_is() are left untouched.
+    """
+    try:
+        st = os.stat(db_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Database not found: {db_path}") from None
+    if str(db_path) in _read_as_is:
+        return
+    key = (str(db_path), st.st_mtime_ns, st.st_size)
+
+    if key in _migrated:
+        return
+
+    try:
+        with pool.connection(db_path) as conn:
+            current = conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION
+        if not current:
+            migrate_db(db_path)
+    except sqlite3.Error as e:
+        print(f"Error upgrading database schema: {e}")
+        return
+
+    st = os.stat(db_path)
+    _migrated.add((str(db_path), st.st_mtime_ns, st.st_size))
+
+
+def check_integrity(db_path):
+    """Runs PRAGMA quick_check; returns None for a healthy SQLite file, else the problem found."""
+    try:
+        conn = open_read_only(db_path)
+        try:
+            rows = conn.execute("PRAGMA quick_check").fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        return str(e)
+
+    if rows != [("ok",)]:
+        return "; ".join(row[0] for row in rows[:5])
+    return None
+
+
+def check_viewable(db_path):
+    """
+    Returns None if db_path is a scan database the viewer can query as it is, else
+    the problem found: not SQLite, no file_paths table, or columns an older scanner
+    did not write yet.
+    """
+    problem = check_integrity(db_path)
+    if problem:
+        return problem
+    try:
+        conn = open_read_only(db_path)
+        try:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(file_paths)")}
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        return str(e)
+
+    if not columns:
+        return "no file_paths table"
+    missing = [column for column in VIEWER_COLUMNS if column not in columns]
+    if missing:
+        return f"file_paths lacks {', '.join(missing)}"
+    return None
+
+
+def read_as_is(db_path):
+    """Marks db_path (a server-side database opened in place) so ensure_schema never writes to it."""
+    _read_as_is.add(str(db_path))
+
+
+@contextmanager
+def connect(db_path):
+    """Borrows a pooled read-only connection to db_path after making sure its schema is current."""
+    ensure_schema(db_path)
+    with pool.connection(db_path) as conn:
+        yield conn
+
 
 def load_duplicates(db_path):
     """Reads duplicates from a normalized DB into a {hash: [paths]} dict."""
     data = {}
 
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
+        with connect(db_path) as conn:
+            data = dict(iter_groups(conn))
+    except Exception as e:
+        print(f"Error reading database: {e}")
 
-        cursor.execute("SELECT hash FROM hashes")
-        hashes = cursor.fetchall()
+    return data
 
-        for (hash_val,) in hashes:
-            cursor.execute("SELECT path FROM file_paths WHERE hash = ?", (hash_val,))
-            paths = [row[0] for row in cursor.fetchall()]
-            data[hash_val] = paths
 
-        conn.close()
+def load_summary(db_path):
+    """
+    Returns {"hashes", "files", "avg", "groups", "wasted"} from the duplicate_summary row
+    kept by each scan, or counted in SQL when that row is stale.
+    """
+    try:
+        with connect(db_path) as conn:
+            summary = read_duplicate_summary(conn)
+            if summary:
+                hashes, files, groups, wasted = (summary["hashes"], summary["files"],
+                                                 summary["groups"], summary["wasted_bytes"])
+            else:
+                hashes, files = conn.execute("SELECT COUNT(DISTINCT hash), COUNT(*) FROM file_paths").fetchone()
+                groups, wasted = conn.execute('''
+                    SELECT COUNT(*), COALESCE(SUM(wasted), 0) FROM (
+                        SELECT COALESCE(MAX(size), 0) * (COUNT(*) - 1) AS wasted
+                        FROM file_paths GROUP BY hash HAVING COUNT(*) > 1
+                    )
+                ''').fetchone()
+    except FileNotFoundError:
+        hashes, files, groups, wasted = 0, 0, 0, 0
     except Exception as e:
         print(f"Error reading database: {e}")
+        hashes, files, groups, wasted = 0, 0, 0, 0
 
-    return data
+    return {
+        "hashes": hashes,
+        "files": files,
+        "avg": round(files / hashes, 2) if hashes else 0,
+        "groups": groups,
+        "wasted": wasted,
+    }
+
+
+def _path_filters(prefix=None, ext=None):
+    """SQL conditions and parameters restricting file_paths rows to a prefix and extension."""
+    clauses, params = [], []
+    if prefix:
+        # A range instead of LIKE so the path index applies and % or _ in paths stay literal
+        clauses.append("path >= ? AND path < ?")
+        params += [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+    if ext:
+        ext = ext if ext.startswith(".") else "." + ext
+        escaped = ext.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        clauses.append("path LIKE ? ESCAPE '\\'")
+        params.append("%" + escaped)
+    return clauses, params
+
+
+def parse_cursor(cursor):
+    """
+    Splits an "after" cursor of the form "<sort value>:<hash>"; None for no cursor.
+    Raises ValueError for a malformed one rather than restarting at the first page,
+    which would send a client following "next" round in circles.
+    """
+    if not cursor:
+        return None
+    key, sep, hash_val = cursor.partition(":")
+    try:
+        if not sep or not hash_val:
+            raise ValueError
+        return int(key), hash_val
+    except ValueError:
+        raise ValueError(f"Malformed cursor: {cursor}") from None
+
+
+def query_duplicate_groups(db_path, limit=PAGE_SIZE, after=None, sort="count", order="desc",
+                           prefix=None, ext=None, min_count=2):
+    """
+    Returns one page of duplicate groups and the cursor for the next page (None at the end).
+
+    Only paths under prefix and ending in ext are considered, and only hashes with at least
+    min_count (never fewer than 2) such paths form a group. Groups are ordered by sort
+    ("count" or "wasted" bytes) and then hash. Pages use keyset pagination: the cursor
+    is the last group's "<sort value>:<hash>", so a page never re-reads or skips rows as
+    OFFSET would when the database changes between requests.
+    Each group is {"hash", "count", "size", "wasted", "paths", "flagged"}, where flagged
+    lists its paths that are also stored under another hash.
+    Without prefix or ext, groups come from the duplicate_groups table kept by each scan
+    (unless it is stale) instead of grouping file_paths on every request.
+    """
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Unsupported sort: {sort}")
+    if order not in ("asc", "desc"):
+        raise ValueError(f"Unsupported order: {order}")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    min_count = max(2, min_count)
+
+    clauses, params = _path_filters(prefix, ext)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    key = SORT_KEYS[sort]
+    op = "<" if order == "desc" else ">"
+
+    live_groups = f"""
+        SELECT hash, COUNT(*) AS copies, MAX(size) AS size,
+               COALESCE(MAX(size), 0) * (COUNT(*) - 1) AS wasted
+        FROM file_paths {where}
+        GROUP BY hash
+        HAVING COUNT(*) >= ?
+    """
+    stored_groups = "SELECT hash, copies, size, wasted FROM duplicate_groups WHERE copies >= ?"
+
+    with connect(db_path) as conn:
+        precomputed = not clauses and read_duplicate_summary(conn) is not None
+        sql = f"""
+            WITH groups AS ({stored_groups if precomputed else live_groups})
+            SELECT hash, copies, size, wasted FROM groups
+            {f"WHERE ({key}, hash) {op} (?, ?)" if after else ""}
+            ORDER BY {key} {order}, hash {order}
+            LIMIT ?
+        """
+        args = params + [min_count] + (list(after) if after else []) + [limit + 1]
+        rows = conn.execute(sql, args).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        groups = {
+            hash_val: {"hash": hash_val, "count": copies, "size": size, "wasted": wasted, "paths": [], "flagged": []}
+            for hash_val, copies, size, wasted in rows
+        }
+        if groups:
+            marks = ",".join("?" * len(groups))
+            path_where = " AND ".join([f"hash IN ({marks})"] + clauses)
+            for hash_val, path in conn.execute(
+                f"SELECT hash, path FROM file_paths WHERE {path_where} ORDER BY hash, path",
+                list(groups) + params
+            ):
+                groups[hash_val]["paths"].append(path)
+
+            # Paths recorded under more than one hash, highlighted in the viewer
+            page_paths = [path for group in groups.values() for path in group["paths"]]
+            flagged = set()
+            for start in range(0, len(page_paths), 500):
+                chunk = page_paths[start:start + 500]
+                flagged.update(row[0] for row in conn.execute(
+                    f"SELECT path FROM file_paths WHERE path IN ({','.join('?' * len(chunk))}) "
+                    f"GROUP BY path HAVING COUNT(*) > 1", chunk
+                ))
+            for group in groups.values():
+                group["flagged"] = [path for path in group["paths"] if path in flagged]
+
+    page = list(groups.values())
+    next_cursor = f"{page[-1][sort]}:{page[-1]['hash']}" if has_more else None
+    return page, next_cursor